@@ -24,5 +24,10 @@ setuptools.setup(
         'pandas',
         'coloredlogs',
         'matplotlib'
-    ]
+    ],
+    entry_points={
+        'console_scripts': [
+            '{} = {}.cli:main'.format(PACKAGE_NAME, PACKAGE_NAME)
+        ]
+    }
 )
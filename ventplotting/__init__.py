@@ -1,3 +1,5 @@
 import logging
 
+__version__ = '0.0.1'
+
 logging.getLogger(__name__).addHandler(logging.NullHandler())
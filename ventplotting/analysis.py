@@ -1,10 +1,31 @@
 """End-to-end analysis of ventilator sensor data."""
+import concurrent.futures
+import logging
+import time
+
+import pandas as pd
+
+from ventplotting.datasets import organization
+from ventplotting.files import results as result_store
+from ventplotting.files import shared
 from ventplotting.files import signals
+from ventplotting.files import streaming
+from ventplotting.processing import breaths
+from ventplotting.processing import events
+from ventplotting.processing import metrics
+from ventplotting.processing import resampling
+from ventplotting.utilities import files
 from ventplotting.utilities import paths
+from ventplotting.utilities import runs
+from ventplotting.utilities import stages
+
+
+logger = logging.getLogger(__name__)
 
 
 ANALYSIS_STAGES = [
-    'raw_all_signals', 'raw_signals'
+    'raw_all_signals', 'raw_signals', 'sampling_stats', 'resampled', 'breaths',
+    'breath_metrics', 'setting_events'
 ]
 
 
@@ -15,39 +36,514 @@ def analysis_stage_before(stage, comparison_stage):
     return stage_index <= comparison_index
 
 
+# STAGES
+
+def compute_sampling_stats(raw_signal_set, **kwargs):
+    """Compute statistics of the sample times of a RawSignalSet."""
+    return resampling.SamplingStats(raw_signal_set.time_array, **kwargs)
+
+
+def compute_resampled(raw_signal_set, sampling_stats, **kwargs):
+    """Resample a RawSignalSet with known sampling statistics."""
+    return resampling.resample(raw_signal_set, sampling_stats=sampling_stats, **kwargs)
+
+
+def compute_breaths(raw_signal_set, **kwargs):
+    """Segment a RawSignalSet into a new BreathSet."""
+    breath_set = breaths.BreathSet()
+    breath_set.segment(raw_signal_set, **kwargs)
+    return breath_set
+
+
+def compute_breath_metrics(raw_signal_set, breath_set):
+    """Compute new BreathMetrics of a BreathSet in a RawSignalSet."""
+    breath_metrics = metrics.BreathMetrics()
+    breath_metrics.compute(raw_signal_set, breath_set)
+    return breath_metrics
+
+
+def compute_setting_events(raw_signal_set):
+    """Find new SettingEvents of a RawSignalSet."""
+    setting_events = events.SettingEvents()
+    setting_events.compute(raw_signal_set)
+    return setting_events
+
+
+def dump_df(df):
+    """Convert a dataframe to a dict of column arrays for a result store."""
+    return {
+        column_name: (
+            df[column_name].to_numpy(dtype=str) if df[column_name].dtype.kind in 'OSUT'
+            else df[column_name].to_numpy()
+        )
+        for column_name in df.columns
+    }
+
+
+def dump_raw_signals(raw_signal_set):
+    """Convert a RawSignalSet to a dict of column arrays for a result store."""
+    return raw_signal_set.arrays
+
+
+def load_raw_signals(columns):
+    """Make a RawSignalSet from a dict of column arrays loaded from a result store."""
+    raw_signal_set = signals.RawSignalSet()
+    raw_signal_set.load_df(pd.DataFrame(columns, copy=False))
+    return raw_signal_set
+
+
+def dump_breaths(breath_set):
+    """Convert a BreathSet to a dict of arrays for a result store."""
+    return {
+        'starts': breath_set.starts, 'expiration_starts': breath_set.expiration_starts,
+        'ends': breath_set.ends
+    }
+
+
+def load_breaths(columns):
+    """Make a BreathSet from a dict of arrays loaded from a result store."""
+    breath_set = breaths.BreathSet()
+    breath_set.starts = columns['starts']
+    breath_set.expiration_starts = columns['expiration_starts']
+    breath_set.ends = columns['ends']
+    return breath_set
+
+
+def dump_breath_metrics(breath_metrics):
+    """Convert BreathMetrics to a dict of column arrays for a result store."""
+    return dump_df(breath_metrics.df)
+
+
+def load_breath_metrics(columns):
+    """Make BreathMetrics from a dict of column arrays loaded from a result store."""
+    breath_metrics = metrics.BreathMetrics()
+    breath_metrics.df = pd.DataFrame(columns, copy=False)
+    return breath_metrics
+
+
+def dump_setting_events(setting_events):
+    """Convert SettingEvents to a dict of column arrays for a result store."""
+    return dump_df(setting_events.df)
+
+
+def load_setting_events(columns):
+    """Make SettingEvents from a dict of column arrays loaded from a result store."""
+    setting_events = events.SettingEvents()
+    setting_events.df = pd.DataFrame(columns)
+    return setting_events
+
+
+def make_stages():
+    """Declare the analysis stages and their dependencies.
+
+    The code of each stage lists the modules its computation depends on
+    besides this one, so that editing any of them invalidates its stored
+    results.
+    """
+    return [
+        stages.Stage(
+            'raw_signals', state=lambda raw_signal_set: raw_signal_set.df,
+            identity=lambda raw_signal_set: raw_signal_set.source
+        ),
+        stages.Stage(
+            'sampling_stats', compute_sampling_stats, dependencies=['raw_signals'],
+            params={'gap_factor': resampling.DEFAULT_GAP_FACTOR}, code=[resampling]
+        ),
+        stages.Stage(
+            'resampled', compute_resampled,
+            dependencies=['raw_signals', 'sampling_stats'],
+            params={
+                'rate': resampling.DEFAULT_RATE, 'method': resampling.DEFAULT_METHOD
+            },
+            dump=dump_raw_signals, load=load_raw_signals,
+            code=[resampling, signals, runs]
+        ),
+        stages.Stage(
+            'breaths', compute_breaths, dependencies=['raw_signals'],
+            params={
+                'flow_threshold': breaths.DEFAULT_FLOW_THRESHOLD,
+                'min_pressure_rise': breaths.DEFAULT_MIN_PRESSURE_RISE
+            },
+            dump=dump_breaths, load=load_breaths, code=[breaths, signals]
+        ),
+        stages.Stage(
+            'breath_metrics', compute_breath_metrics,
+            dependencies=['raw_signals', 'breaths'],
+            dump=dump_breath_metrics, load=load_breath_metrics,
+            code=[metrics, breaths, signals, runs]
+        ),
+        stages.Stage(
+            'setting_events', compute_setting_events, dependencies=['raw_signals'],
+            dump=dump_setting_events, load=load_setting_events,
+            code=[events, signals, runs]
+        )
+    ]
+
+
+# ANALYZERS
+
 class VentAnalyzer(object):
-    """Ventilator signal analyzer."""
+    """Ventilator signal analyzer.
+
+    Analysis stages are computed lazily when their results are first
+    accessed, and are memoized until their inputs or parameters change (see
+    make_stages and utilities.stages.StageGraph). For example, plotting of
+    raw signals never segments breaths. Results of stages computed from
+    data files are also persisted in an on-disk result store, so that
+    analyzing the same file again only loads them.
+    """
 
-    def __init__(self, vent_analyzer=None, link_endpoint='raw_signals'):
+    def __init__(self, vent_analyzer=None, link_endpoint='raw_signals', store=True):
         """Initialize analyzer object without any data or configs loaded.
 
-        If vent_analyzer is given, members (representing analysis stages) will
-        be linked to it instead of respective new objects being instantiated.
-        All members will be linked up to and including the member specified by
-        the link_endpoint parameter.
+        If vent_analyzer is given, analysis stages will share their results
+        with it instead of being computed separately. The stage specified by
+        the link_endpoint parameter and all stages it depends on are linked.
+        The store may be True (the default result store), False (no
+        persistence) or a ResultStore.
         """
-        def link(reference_stage):
-            return (
-                vent_analyzer is not None
-                and analysis_stage_before(reference_stage, link_endpoint)
+        self.stages = stages.StageGraph(
+            make_stages(), store=result_store.resolve_store(store)
+        )
+        self.stages.set('raw_signals', signals.RawSignalSet())
+        if vent_analyzer is not None and link_endpoint in self.stages.stages:
+            self.stages.link(
+                vent_analyzer.stages,
+                self.stages.ancestors(link_endpoint) | {link_endpoint}
             )
 
-        if link('raw_signals'):
-            self.raw_signals = vent_analyzer.raw_signals
-        else:
-            self._make_empty_raw_signals()
+    # Stage results
+
+    @property
+    def raw_signals(self):
+        """Get the RawSignalSet of the raw signals."""
+        return self.stages.get('raw_signals')
 
-    def _make_empty_raw_signals(self):
-        self.raw_signals = signals.RawSignalSet()
+    @raw_signals.setter
+    def raw_signals(self, raw_signal_set):
+        self.stages.set('raw_signals', raw_signal_set)
+
+    @property
+    def breaths(self):
+        """Get the BreathSet of the raw signals, segmenting them as needed."""
+        return self.stages.get('breaths')
+
+    @breaths.setter
+    def breaths(self, breath_set):
+        self.stages.set('breaths', breath_set)
+
+    @property
+    def breath_metrics(self):
+        """Get the BreathMetrics of the breaths, computing them as needed."""
+        return self.stages.get('breath_metrics')
+
+    @breath_metrics.setter
+    def breath_metrics(self, breath_metrics):
+        self.stages.set('breath_metrics', breath_metrics)
+
+    @property
+    def setting_events(self):
+        """Get the SettingEvents of the raw signals, finding them as needed."""
+        return self.stages.get('setting_events')
+
+    @setting_events.setter
+    def setting_events(self, setting_events):
+        self.stages.set('setting_events', setting_events)
 
     # DATA
 
-    def load_data(self, name, dir):
-        """Load all data files needed for analysis."""
+    def load_data(self, name, dir, shared_signals=None):
+        """Load all data files needed for analysis.
+
+        If shared_signals is the name of a files.shared.SharedSignalSet of
+        the data file (e.g. published by the process which started this
+        one), the raw signals are attached from shared memory instead of
+        being read from the file. Analysis stages are only computed once
+        their results are accessed.
+        """
+        if shared_signals is not None:
+            self.raw_signals = shared.attach_signal_set(shared_signals)
+            return
         self.raw_signals.load_csv(paths.csv_name_to_path(name, dir=dir))
 
+    def stream_data(self, name, dir, **kwargs):
+        """Iterate over windows of a data file too large to load at once.
+
+        Each window is yielded as a new analyzer holding only that window's
+        signals. Keyword arguments are passed to streaming.iter_windows.
+        """
+        path = paths.csv_name_to_path(name, dir=dir)
+        for window in streaming.iter_windows(path, **kwargs):
+            analyzer = VentAnalyzer()
+            analyzer.raw_signals = window
+            yield analyzer
+
+    def window(self, start_time=None, end_time=None, realign_time=False):
+        """Get an analyzer of the raw signals between two times in seconds.
+
+        The raw signals of the new analyzer are a SignalWindow referencing
+        the arrays of this analyzer's raw signals instead of copying them, so
+        many windows of one recording only hold one copy of its data. Stage
+        parameters are copied, and stages of the window are computed lazily
+        from the window's samples.
+        """
+        analyzer = VentAnalyzer(store=self.stages.store)
+        for stage_name in self.stages.stages:
+            analyzer.stages.set_params(stage_name, **self.stages.params(stage_name))
+        analyzer.raw_signals = self.raw_signals.window(
+            start_time=start_time, end_time=end_time, realign_time=realign_time
+        )
+        return analyzer
+
+    # ANALYSIS
+
+    def analyze(self):
+        """Run all analysis stages now instead of on first access."""
+        self.analyze_breaths()
+        self.analyze_breath_metrics()
+        self.analyze_setting_events()
+
+    def sampling_stats(self, **kwargs):
+        """Get statistics of the sample times of the raw signals.
+
+        Keyword arguments override the parameters of the stage (gap_factor).
+        """
+        return self.stages.get('sampling_stats', **kwargs)
+
+    def resampled(self, **kwargs):
+        """Get the raw signals resampled onto a uniform grid.
+
+        Keyword arguments override the parameters of the stage (rate in Hz and
+        method), and a RawSignalSet is memoized for each combination of them.
+        Waveform values within gaps of the sample times are NaN.
+        """
+        return self.stages.get('resampled', **kwargs)
+
+    def analyze_breaths(self, **kwargs):
+        """Segment the raw signals into breaths.
+
+        Keyword arguments are passed to BreathSet.segment, and are kept as
+        the parameters of the stage for later (re)computations.
+        """
+        self.stages.set_params('breaths', **kwargs)
+        self.stages.get('breaths')
+
+    def analyze_breath_metrics(self):
+        """Compute metrics of each breath."""
+        self.stages.get('breath_metrics')
+
+    def analyze_setting_events(self):
+        """Find the transitions of control settings."""
+        self.stages.get('setting_events')
+
+    # RESULTS
+
+    def setting_event_windows(self, **kwargs):
+        """Get a window around each transition of control settings.
+
+        Keyword arguments are passed to SettingEvents.windows. Breaths are
+        only segmented if the window unit is 'breaths', in which case each
+        transition is also labeled with the index of the following breath.
+        """
+        breath_set = self.breaths if kwargs.get('unit') == 'breaths' else None
+        return self.setting_events.windows(self.raw_signals, breath_set, **kwargs)
+
+    def save_breath_metrics(self, name, dir):
+        """Save the per-breath metrics next to the data file with a shared name."""
+        self.breath_metrics.save_csv(paths.breath_metrics_csv_name_to_path(name, dir=dir))
+
+    def load_breath_metrics(self, name, dir):
+        """Load per-breath metrics saved by save_breath_metrics.
+
+        The loaded metrics are kept until the raw signals or breaths change.
+        """
+        breath_metrics = metrics.BreathMetrics()
+        breath_metrics.load_csv(paths.breath_metrics_csv_name_to_path(name, dir=dir))
+        self.breath_metrics = breath_metrics
+
     # CONFIGS
 
     def load_configs(self, name, dir):
-        """Load all configuration files with a shared name and directory."""
-        pass
+        """Load all configuration files with a shared name and directory.
+
+        Parameters of analysis stages are loaded from a stages json file, if
+        it exists, as a dict from stage names to dicts of parameters.
+        """
+        path = paths.stages_json_name_to_path(name, dir=dir)
+        if not path.exists():
+            return
+        for (stage_name, params) in files.load_json(path).items():
+            if stage_name not in self.stages.stages:
+                raise ValueError('Unknown analysis stage {}!'.format(stage_name))
+            self.stages.set_params(stage_name, **params)
+
+    def save_configs(self, name, dir):
+        """Save the parameters of analysis stages, as loaded by load_configs."""
+        files.dump_json(
+            {
+                stage_name: self.stages.params(stage_name)
+                for stage_name in self.stages.stages
+                if self.stages.params(stage_name)
+            },
+            path=paths.stages_json_name_to_path(name, dir=dir)
+        )
+
+
+# COLLECTIONS
+
+def analyze_file(path, share=True, shared_dir=None):
+    """Load and analyze a data file, for transfer of the results to another process.
+
+    Returns a dict of the analysis results and the durations of loading,
+    analysis and export. If share is True, the raw signal columns are exported
+    to shared memory instead of being included in the results, so that
+    returning them from a worker process doesn't require pickling them.
+    """
+    start = time.perf_counter()
+    analyzer = VentAnalyzer()
+    analyzer.raw_signals.load_csv(path)
+    load_duration = time.perf_counter() - start
+    analyzer.analyze()
+    analysis_duration = time.perf_counter() - start - load_duration
+    raw_signals = analyzer.raw_signals.df
+    if share:
+        raw_signals = shared.export_arrays(analyzer.raw_signals.arrays, dir=shared_dir)
+    return {
+        'raw_signals': raw_signals,
+        'breaths': (
+            analyzer.breaths.starts, analyzer.breaths.expiration_starts,
+            analyzer.breaths.ends
+        ),
+        'breath_metrics': analyzer.breath_metrics.df,
+        'setting_events': analyzer.setting_events.df,
+        'timings': {
+            'load': load_duration, 'analysis': analysis_duration,
+            'export': time.perf_counter() - start - load_duration - analysis_duration
+        }
+    }
+
+
+def receive_analysis(results):
+    """Make a VentAnalyzer from the results of analyze_file."""
+    analyzer = VentAnalyzer()
+    raw_signals = results['raw_signals']
+    if not isinstance(raw_signals, pd.DataFrame):
+        raw_signals = pd.DataFrame(shared.import_arrays(raw_signals), copy=False)
+    analyzer.raw_signals.load_df(raw_signals)
+    breath_set = breaths.BreathSet()
+    (breath_set.starts, breath_set.expiration_starts, breath_set.ends) = (
+        results['breaths']
+    )
+    analyzer.breaths = breath_set
+    analyzer.breath_metrics = metrics.BreathMetrics()
+    analyzer.breath_metrics.df = results['breath_metrics']
+    analyzer.setting_events = events.SettingEvents()
+    analyzer.setting_events.df = results['setting_events']
+    return analyzer
+
+
+class CollectionAnalyzer(object):
+    """Analyzer of all data files in a dataset collection, loaded in parallel.
+
+    Each data file is loaded and analyzed in a pool of worker processes. Raw
+    signals are returned through shared memory, and are memory-mapped by the
+    parent process rather than unpickled. Analyzers are stored by dataset
+    name and data name.
+    """
+
+    def __init__(
+            self, collection_name, collections_dir=organization.DATASET_COLLECTIONS_PATH
+    ):
+        """Initialize the analyzer for a collection, without loading any data."""
+        self.collection_name = collection_name
+        self.collections_dir = collections_dir
+        self.analyzers = {}  # VentAnalyzers by (dataset name, data name)
+        self.timings = {}  # dicts of durations in seconds by (dataset name, data name)
+
+    def data_paths(self, dataset_names=None):
+        """Get the paths of data files by (dataset name, data name).
+
+        If dataset_names is None, all datasets of the collection are included.
+        """
+        if dataset_names is None:
+            dataset_names = organization.list_datasets(
+                self.collection_name, collections_dir=self.collections_dir
+            )
+        return {
+            (dataset_name, data_name): paths.csv_name_to_path(
+                data_name, dir=organization.dataset_path(
+                    dataset_name, self.collection_name,
+                    collections_dir=self.collections_dir
+                )
+            )
+            for dataset_name in dataset_names
+            for data_name in organization.list_data_names(
+                dataset_name, self.collection_name,
+                collections_dir=self.collections_dir
+            )
+        }
+
+    def load_data(self, dataset_names=None, num_workers=None, shared_dir=None):
+        """Load and analyze all data files of the selected datasets.
+
+        Files are analyzed in num_workers processes (or in this process if
+        num_workers is 1). Timings of each file include its load, analysis
+        and export durations in the worker, the import duration in this
+        process, and the total wall time from submission to import.
+        """
+        data_paths = self.data_paths(dataset_names=dataset_names)
+        if num_workers == 1:
+            for (key, path) in data_paths.items():
+                start = time.perf_counter()
+                self._receive(key, analyze_file(path, share=False), start)
+            return
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers=num_workers) as executor:
+            start = time.perf_counter()
+            futures = {
+                executor.submit(analyze_file, path, shared_dir=shared_dir): key
+                for (key, path) in data_paths.items()
+            }
+            received = set()  # futures whose exports were handed to import_arrays
+            try:
+                for future in concurrent.futures.as_completed(futures):
+                    received.add(future)
+                    self._receive(futures[future], future.result(), start)
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                for future in futures:
+                    if future in received or future.cancelled():
+                        continue
+                    if future.exception() is None:
+                        results = future.result()
+                        if not isinstance(results['raw_signals'], pd.DataFrame):
+                            shared.discard_export(results['raw_signals'])
+                raise
+
+    def _receive(self, key, results, start):
+        import_start = time.perf_counter()
+        self.analyzers[key] = receive_analysis(results)
+        now = time.perf_counter()
+        self.timings[key] = {
+            **results['timings'], 'import': now - import_start, 'total': now - start
+        }
+        logger.info(
+            'Analyzed %s/%s in %.2f s', key[0], key[1], sum(results['timings'].values())
+        )
+
+    def timings_df(self):
+        """Get a dataframe of the timings of each file by dataset and data name."""
+        return pd.DataFrame(
+            list(self.timings.values()), index=pd.MultiIndex.from_tuples(
+                list(self.timings.keys()), names=['Dataset', 'Data']
+            )
+        ).sort_index()
+
+    def __getitem__(self, key):
+        """Get the VentAnalyzer of a (dataset name, data name) pair."""
+        return self.analyzers[key]
+
+    def __len__(self):
+        """Get the number of analyzed data files."""
+        return len(self.analyzers)
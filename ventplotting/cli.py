@@ -0,0 +1,177 @@
+"""Command-line interface for the ventplotting package."""
+import argparse
+import logging
+import sys
+import time
+
+from ventplotting.processing import events
+from ventplotting.utilities import files
+
+
+logger = logging.getLogger(__name__)
+
+
+# COMMANDS
+
+def render(args):
+    """Render figures for all windows of a collection spec."""
+    # Import here so that the Agg backend is chosen before any figures exist
+    from ventplotting.plotting import batch
+
+    spec = files.load_json(args.spec)
+    if args.collections_path is not None:
+        spec['dataset_collections_path'] = args.collections_path
+    output_dir = args.output_dir
+    if output_dir is None:
+        output_dir = spec['dataset_collection_name']
+    start = time.perf_counter()
+    results = batch.render_collection(
+        spec, output_dir, formats=args.formats.split(','), num_workers=args.jobs,
+        share_signals=args.share_signals
+    )
+    num_files = sum(len(result['output_paths']) for result in results)
+    logger.info(
+        'Rendered %d files from %d data files in %.2f s', num_files, len(results),
+        time.perf_counter() - start
+    )
+
+
+def transitions(args):
+    """Render figures around the setting transitions of a dataset collection."""
+    from ventplotting.plotting import batch
+
+    kwargs = {}
+    if args.collections_path is not None:
+        kwargs['collections_dir'] = args.collections_path
+    if args.datasets is not None:
+        kwargs['dataset_names'] = args.datasets.split(',')
+    if args.settings is not None:
+        kwargs['settings'] = args.settings.split(',')
+    output_dir = args.output_dir
+    if output_dir is None:
+        output_dir = args.collection
+    start = time.perf_counter()
+    jobs = batch.make_transition_jobs(
+        args.collection, before=args.before, after=args.after, unit=args.unit,
+        **kwargs
+    )
+    results = batch.render_jobs(
+        jobs, output_dir, formats=args.formats.split(','), num_workers=args.jobs,
+        share_signals=args.share_signals
+    )
+    num_files = sum(len(result['output_paths']) for result in results)
+    logger.info(
+        'Rendered %d files from %d data files in %.2f s', num_files, len(results),
+        time.perf_counter() - start
+    )
+
+
+# MAIN
+
+def make_parser():
+    """Make the command-line argument parser."""
+    parser = argparse.ArgumentParser(
+        prog='ventplotting', description='Vent4US ventilator data processing.'
+    )
+    parser.add_argument(
+        '-v', '--verbose', action='store_true', help='log progress messages'
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    render_parser = subparsers.add_parser(
+        'render', help='render measurement figures for a dataset collection',
+        description=(
+            'Render measurement figures for a dataset collection spec: a JSON '
+            'file with dataset_collections_path, dataset_collection_name and '
+            'data_entries, as in the parameters of collection notebooks.'
+        )
+    )
+    render_parser.add_argument('spec', help='path of the JSON collection spec')
+    render_parser.add_argument(
+        '-o', '--output-dir',
+        help='directory to save figures in (default: the collection name)'
+    )
+    render_parser.add_argument(
+        '-c', '--collections-path',
+        help='override the dataset_collections_path of the spec'
+    )
+    render_parser.add_argument(
+        '-j', '--jobs', type=int, default=None,
+        help='number of worker processes (default: number of CPUs)'
+    )
+    render_parser.add_argument(
+        '-f', '--formats', default='png,pdf,svg',
+        help='comma-separated figure file formats (default: png,pdf,svg)'
+    )
+    render_parser.add_argument(
+        '--share-signals', action='store_true',
+        help='load each data file once and split its windows among all workers'
+    )
+    render_parser.set_defaults(func=render)
+
+    transitions_parser = subparsers.add_parser(
+        'transitions',
+        help='render measurement figures around setting transitions',
+        description=(
+            'Render a measurement figure for a window around each transition of '
+            'control settings in each data file of a dataset collection.'
+        )
+    )
+    transitions_parser.add_argument('collection', help='name of the dataset collection')
+    transitions_parser.add_argument(
+        '-o', '--output-dir',
+        help='directory to save figures in (default: the collection name)'
+    )
+    transitions_parser.add_argument(
+        '-c', '--collections-path',
+        help='parent directory of dataset collections (default: as for notebooks)'
+    )
+    transitions_parser.add_argument(
+        '-d', '--datasets',
+        help='comma-separated dataset names (default: all datasets)'
+    )
+    transitions_parser.add_argument(
+        '-s', '--settings',
+        help='comma-separated settings, e.g. PEEP,Vt (default: all settings)'
+    )
+    transitions_parser.add_argument(
+        '-b', '--before', type=float, default=events.DEFAULT_WINDOW_BEFORE,
+        help='window length before each transition (default: %(default)s)'
+    )
+    transitions_parser.add_argument(
+        '-a', '--after', type=float, default=events.DEFAULT_WINDOW_AFTER,
+        help='window length after each transition (default: %(default)s)'
+    )
+    transitions_parser.add_argument(
+        '-u', '--unit', choices=events.WINDOW_UNITS, default=events.DEFAULT_WINDOW_UNIT,
+        help='unit of window lengths (default: %(default)s)'
+    )
+    transitions_parser.add_argument(
+        '-j', '--jobs', type=int, default=None,
+        help='number of worker processes (default: number of CPUs)'
+    )
+    transitions_parser.add_argument(
+        '-f', '--formats', default='png,pdf,svg',
+        help='comma-separated figure file formats (default: png,pdf,svg)'
+    )
+    transitions_parser.add_argument(
+        '--share-signals', action='store_true',
+        help='load each data file once and split its windows among all workers'
+    )
+    transitions_parser.set_defaults(func=transitions)
+    return parser
+
+
+def main(argv=None):
+    """Run the command-line interface."""
+    args = make_parser().parse_args(argv)
+    if args.verbose:
+        package_logger = logging.getLogger('ventplotting')
+        package_logger.addHandler(logging.StreamHandler())
+        package_logger.setLevel(logging.INFO)
+    args.func(args)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
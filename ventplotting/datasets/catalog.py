@@ -0,0 +1,341 @@
+"""SQLite catalog of the data files in dataset collections."""
+import concurrent.futures
+import logging
+import sqlite3
+import time
+
+import numpy as np
+
+from ventplotting.datasets import organization
+from ventplotting.files import cache as signal_cache
+from ventplotting.files import signals
+from ventplotting.utilities import paths
+from ventplotting.utilities import runs
+
+
+logger = logging.getLogger(__name__)
+
+
+CATALOG_NAME = 'catalog.sqlite3'
+CATALOG_SCHEMA_VERSION = 1  # increment whenever the tables or summaries change
+SETTING_DECIMALS = 3  # settings are rounded so that they can be compared exactly
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    collection TEXT NOT NULL,
+    dataset TEXT NOT NULL,
+    data_name TEXT NOT NULL,
+    path TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    indexed REAL NOT NULL,
+    duration REAL,
+    num_samples INTEGER,
+    sample_rate REAL
+);
+CREATE TABLE IF NOT EXISTS columns (
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    column_name TEXT NOT NULL,
+    min REAL,
+    max REAL,
+    PRIMARY KEY (file_id, column_name)
+);
+CREATE TABLE IF NOT EXISTS settings_runs (
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    start_time REAL NOT NULL,
+    end_time REAL NOT NULL,
+    Vt REAL,
+    Ti REAL,
+    RR REAL,
+    PEEP REAL
+);
+CREATE INDEX IF NOT EXISTS settings_runs_file ON settings_runs (file_id, start_time);
+CREATE INDEX IF NOT EXISTS settings_runs_settings ON settings_runs (Vt, PEEP, RR, Ti);
+'''
+
+
+# SUMMARIES
+
+def settings_runs(times, encodings):
+    """Find the runs of consecutive samples in which no setting changes.
+
+    Encodings is a dict of RunLengthEncodings of setting columns sampled at
+    times, whose change points are merged into joint runs. Returns a
+    list of dicts with the start and end times (of the first and last
+    samples) of each run and its settings, rounded to SETTING_DECIMALS.
+    """
+    if not encodings or not len(times):
+        return []
+    starts = runs.joint_run_starts(list(encodings.values()))
+    start_times = times[starts]
+    end_times = np.append(times[starts[1:] - 1], times[-1])
+    values = {
+        column_name: encoding.values_at_indices(starts).astype('float64')
+        for (column_name, encoding) in encodings.items()
+    }
+    return [
+        {
+            'start_time': float(start_time), 'end_time': float(end_time),
+            **{
+                column_name: (
+                    None if np.isnan(column_values[i])
+                    else round(float(column_values[i]), SETTING_DECIMALS)
+                )
+                for (column_name, column_values) in values.items()
+            }
+        }
+        for (i, (start_time, end_time)) in enumerate(zip(start_times, end_times))
+    ]
+
+
+def summarize_file(path, cache=False):
+    """Summarize a data file for the catalog as a dict."""
+    raw_signal_set = signals.RawSignalSet()
+    raw_signal_set.load_csv(path, cache=cache)
+    arrays = raw_signal_set.arrays
+    times = arrays['Time']
+    intervals = np.diff(times)
+    return {
+        'duration': float(times[-1] - times[0]) if len(times) else 0.0,
+        'num_samples': len(times),
+        'sample_rate': float(1 / np.median(intervals)) if len(intervals) else None,
+        'columns': {
+            column_name: (
+                (float(np.nanmin(values)), float(np.nanmax(values)))
+                if len(values) and not np.all(np.isnan(values)) else (None, None)
+            )
+            for (column_name, values) in arrays.items() if column_name != 'Time'
+        },
+        'settings_runs': settings_runs(times, raw_signal_set.settings_runs)
+    }
+
+
+# CATALOGS
+
+class DatasetCatalog(object):
+    """SQLite catalog of the data files of dataset collections, for fast queries.
+
+    Each data file has a row with its size and mtime (so that only changed
+    files are re-indexed), its duration, number of samples and sample rate,
+    the min and max of each of its columns, and the runs of samples with
+    constant ventilator settings.
+    """
+
+    def __init__(self, path):
+        """Open (or create) the catalog at the given path."""
+        self.path = path
+        self.connection = sqlite3.connect(str(path))
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute('PRAGMA foreign_keys = ON')
+        version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+        if version not in (0, CATALOG_SCHEMA_VERSION):
+            logger.info('Rebuilding outdated catalog %s', path)
+            with self.connection:
+                for table in ['settings_runs', 'columns', 'files']:
+                    self.connection.execute('DROP TABLE IF EXISTS {}'.format(table))
+        with self.connection:
+            self.connection.executescript(SCHEMA)
+            self.connection.execute(
+                'PRAGMA user_version = {}'.format(CATALOG_SCHEMA_VERSION)
+            )
+
+    def close(self):
+        """Close the catalog."""
+        self.connection.close()
+
+    def __enter__(self):
+        """Use the catalog as a context manager."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Close the catalog."""
+        self.close()
+
+    # Indexing
+
+    def index_collection(
+            self, collection_name,
+            collections_dir=organization.DATASET_COLLECTIONS_PATH, num_workers=None
+    ):
+        """Index all data files of a collection which are new or have changed.
+
+        Files are summarized in parallel in num_workers processes (or in this
+        process if num_workers is 1). Files which no longer exist are removed
+        from the catalog. Returns a dict of the numbers of indexed, unchanged
+        and removed files.
+        """
+        known = {
+            row['path']: (row['size'], row['mtime_ns'])
+            for row in self.connection.execute(
+                'SELECT path, size, mtime_ns FROM files WHERE collection = ?',
+                (collection_name,)
+            )
+        }
+        pending = []
+        found = set()
+        for dataset_name in organization.list_datasets(
+            collection_name, collections_dir=collections_dir
+        ):
+            dataset_path = organization.dataset_path(
+                dataset_name, collection_name, collections_dir=collections_dir
+            )
+            for data_name in organization.list_data_names(
+                dataset_name, collection_name, collections_dir=collections_dir
+            ):
+                fingerprint = signal_cache.file_fingerprint(
+                    paths.csv_name_to_path(data_name, dir=dataset_path)
+                )
+                found.add(fingerprint['path'])
+                if known.get(fingerprint['path']) != (
+                    fingerprint['size'], fingerprint['mtime_ns']
+                ):
+                    pending.append((dataset_name, data_name, fingerprint))
+
+        pending_paths = [fingerprint['path'] for (_, _, fingerprint) in pending]
+        if num_workers == 1:
+            summaries = [summarize_file(path) for path in pending_paths]
+        else:
+            with concurrent.futures.ProcessPoolExecutor(
+                max_workers=num_workers
+            ) as executor:
+                summaries = list(executor.map(summarize_file, pending_paths))
+
+        removed = set(known.keys()) - found
+        with self.connection:
+            for path in removed:
+                self.connection.execute('DELETE FROM files WHERE path = ?', (path,))
+            for ((dataset_name, data_name, fingerprint), summary) in zip(
+                pending, summaries
+            ):
+                self._store(
+                    collection_name, dataset_name, data_name, fingerprint, summary
+                )
+        logger.info(
+            'Indexed %d files of %s (%d unchanged, %d removed)', len(pending),
+            collection_name, len(found) - len(pending), len(removed)
+        )
+        return {
+            'indexed': len(pending), 'unchanged': len(found) - len(pending),
+            'removed': len(removed)
+        }
+
+    def _store(self, collection_name, dataset_name, data_name, fingerprint, summary):
+        self.connection.execute(
+            'DELETE FROM files WHERE path = ?', (fingerprint['path'],)
+        )
+        file_id = self.connection.execute(
+            'INSERT INTO files (collection, dataset, data_name, path, size, mtime_ns, '
+            'indexed, duration, num_samples, sample_rate) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (
+                collection_name, dataset_name, data_name, fingerprint['path'],
+                fingerprint['size'], fingerprint['mtime_ns'], time.time(),
+                summary['duration'], summary['num_samples'], summary['sample_rate']
+            )
+        ).lastrowid
+        self.connection.executemany(
+            'INSERT INTO columns (file_id, column_name, min, max) VALUES (?, ?, ?, ?)',
+            [
+                (file_id, column_name, min_value, max_value)
+                for (column_name, (min_value, max_value)) in summary['columns'].items()
+            ]
+        )
+        self.connection.executemany(
+            'INSERT INTO settings_runs '
+            '(file_id, start_time, end_time, Vt, Ti, RR, PEEP) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [
+                (
+                    file_id, run['start_time'], run['end_time'], run.get('Vt'),
+                    run.get('Ti'), run.get('RR'), run.get('PEEP')
+                )
+                for run in summary['settings_runs']
+            ]
+        )
+
+    # Queries
+
+    def files(self, collection_name=None):
+        """Get the catalog rows of all data files, optionally of one collection."""
+        query = 'SELECT * FROM files'
+        params = ()
+        if collection_name is not None:
+            query += ' WHERE collection = ?'
+            params = (collection_name,)
+        query += ' ORDER BY collection, dataset, data_name'
+        return [dict(row) for row in self.connection.execute(query, params)]
+
+    def column_ranges(self, path):
+        """Get the (min, max) of each column of a data file, by column name."""
+        return {
+            row['column_name']: (row['min'], row['max'])
+            for row in self.connection.execute(
+                'SELECT column_name, min, max FROM columns '
+                'JOIN files ON files.id = columns.file_id WHERE files.path = ?',
+                (str(signal_cache.file_fingerprint(path)['path']),)
+            )
+        }
+
+    def query_windows(self, collection_name=None, **settings):
+        """Find the time windows of data files with the given settings.
+
+        Each keyword argument is a setting column name (Vt, Ti, RR or PEEP)
+        and either a value or a list/tuple of allowed values, e.g.
+        query_windows(Vt=300, PEEP=(5, 10)). Consecutive runs of matching
+        settings are merged into one window. Returns a list of dicts with the
+        collection, dataset, data name, path and start and end times (in
+        seconds) of each window.
+        """
+        conditions = []
+        params = []
+        for (column_name, values) in settings.items():
+            if column_name not in signals.SETTING_COLUMNS:
+                raise ValueError('Unknown setting {}!'.format(column_name))
+            if not isinstance(values, (list, tuple, set)):
+                values = [values]
+            values = [round(float(value), SETTING_DECIMALS) for value in values]
+            conditions.append('runs.{} IN ({})'.format(
+                column_name, ', '.join('?' * len(values))
+            ))
+            params.extend(values)
+        if collection_name is not None:
+            conditions.append('files.collection = ?')
+            params.append(collection_name)
+        # Only matching runs are selected, each with the start time of the
+        # previous run of its file (looked up in the file index), so that
+        # runs are merged only if no run which didn't match lies between them
+        query = '''
+            SELECT files.collection, files.dataset, files.data_name, files.path,
+                runs.start_time, runs.end_time, (
+                    SELECT MAX(previous.start_time) FROM settings_runs AS previous
+                    WHERE previous.file_id = runs.file_id
+                        AND previous.start_time < runs.start_time
+                ) AS previous_start_time
+            FROM settings_runs AS runs JOIN files ON files.id = runs.file_id
+            WHERE {}
+            ORDER BY files.collection, files.dataset, files.data_name, runs.start_time
+        '''.format(' AND '.join(conditions) if conditions else '1')
+        windows = []
+        last_start_time = None
+        for row in self.connection.execute(query, params):
+            merge = windows and windows[-1]['path'] == row['path']
+            if merge and row['previous_start_time'] == last_start_time:
+                windows[-1]['end_time'] = row['end_time']
+            else:
+                windows.append({
+                    'collection': row['collection'], 'dataset': row['dataset'],
+                    'data_name': row['data_name'], 'path': row['path'],
+                    'start_time': row['start_time'], 'end_time': row['end_time']
+                })
+            last_start_time = row['start_time']
+        return windows
+
+
+def collection_catalog(
+        collection_name, collections_dir=organization.DATASET_COLLECTIONS_PATH
+):
+    """Open the catalog stored at the root of a dataset collection."""
+    return DatasetCatalog(
+        organization.collection_path(collection_name, dir=collections_dir) / CATALOG_NAME
+    )
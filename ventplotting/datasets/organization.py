@@ -29,3 +29,28 @@ def data_path(
     return dataset_path(
         dataset_name, collection_name, collections_dir=collections_dir
     ) / data_name
+
+
+DERIVED_CSV_SUFFIXES = ['_breath_metrics']  # suffixes of csv files which aren't data
+
+
+def list_datasets(collection_name, collections_dir=DATASET_COLLECTIONS_PATH):
+    """Return the sorted names of the datasets in the named dataset collection."""
+    path = collection_path(collection_name, dir=collections_dir)
+    return sorted(
+        dataset.name for dataset in path.iterdir()
+        if dataset.is_dir() and not dataset.name.startswith('.')
+    )
+
+
+def list_data_names(
+        dataset_name, collection_name,
+        collections_dir=DATASET_COLLECTIONS_PATH
+):
+    """Return the sorted names of the data csv files in the named dataset."""
+    return sorted(
+        path.stem for path in dataset_path(
+            dataset_name, collection_name, collections_dir=collections_dir
+        ).glob('*.csv')
+        if not any(path.stem.endswith(suffix) for suffix in DERIVED_CSV_SUFFIXES)
+    )
@@ -0,0 +1,245 @@
+"""On-disk binary cache of parsed signal files."""
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import shutil
+
+import numpy as np
+
+from ventplotting.utilities import files
+
+
+logger = logging.getLogger(__name__)
+
+
+CACHE_FORMAT_VERSION = 1  # increment whenever the layout of cache entries changes
+CACHE_DIR_ENV_VAR = 'VENTPLOTTING_CACHE_DIR'
+DEFAULT_CACHE_DIR = pathlib.Path.home() / '.cache' / 'ventplotting' / 'signals'
+DEFAULT_MAX_BYTES = 4 * 1024 ** 3  # 4 GiB
+MANIFEST_NAME = 'manifest.json'
+
+
+# FINGERPRINTS
+
+def file_fingerprint(path):
+    """Return a dict identifying the current contents of a file by path, size and mtime."""
+    path = pathlib.Path(path).resolve()
+    stat = path.stat()
+    return {'path': str(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def fingerprint_key(fingerprint, **params):
+    """Hash a file fingerprint and any loading parameters into a cache key."""
+    key_data = {
+        'version': CACHE_FORMAT_VERSION, 'file': fingerprint, 'params': params
+    }
+    key_string = json.dumps(key_data, sort_keys=True, default=str)
+    return hashlib.sha1(key_string.encode('utf-8')).hexdigest()
+
+
+# STATISTICS
+
+class CacheStats(object):
+    """Counters of cache usage."""
+
+    def __init__(self):
+        """Initialize all counters to zero."""
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+
+    @property
+    def hit_rate(self):
+        """Get the fraction of lookups which were hits."""
+        lookups = self.hits + self.misses
+        if lookups == 0:
+            return 0.0
+        return self.hits / lookups
+
+    def as_dict(self):
+        """Return the counters as a dict."""
+        return {
+            'hits': self.hits, 'misses': self.misses, 'writes': self.writes,
+            'evictions': self.evictions, 'evicted_bytes': self.evicted_bytes,
+            'hit_rate': self.hit_rate
+        }
+
+    def __repr__(self):
+        """Represent the counters."""
+        return 'CacheStats({})'.format(
+            ', '.join('{}={}'.format(*item) for item in self.as_dict().items())
+        )
+
+
+# CACHE
+
+class SignalCache(object):
+    """Directory of cached signal columns stored as memory-mappable .npy files.
+
+    Each entry is a subdirectory named by its key, holding one .npy file per
+    column plus a manifest with the column names and the source file's
+    fingerprint. Entries are evicted in least-recently-used order whenever the
+    total size of the cache exceeds max_bytes.
+    """
+
+    def __init__(self, dir=None, max_bytes=DEFAULT_MAX_BYTES, mmap=True):
+        """Initialize the cache in the given directory.
+
+        If dir is None, the directory is taken from the VENTPLOTTING_CACHE_DIR
+        environment variable, or else from DEFAULT_CACHE_DIR. If max_bytes is
+        None, the cache is never evicted.
+        """
+        if dir is None:
+            dir = os.environ.get(CACHE_DIR_ENV_VAR, DEFAULT_CACHE_DIR)
+        self.dir = pathlib.Path(dir)
+        self.max_bytes = max_bytes
+        self.mmap = mmap
+        self.stats = CacheStats()
+
+    def entry_path(self, key):
+        """Get the directory path of a cache entry."""
+        return self.dir / key
+
+    def key(self, path, **params):
+        """Get the cache key of a file loaded with the given parameters."""
+        return fingerprint_key(file_fingerprint(path), **params)
+
+    def load(self, path, fingerprint=None, **params):
+        """Load cached columns of a file as a dict of arrays, or None on a miss.
+
+        The fingerprint of the file is taken now unless given.
+        """
+        if fingerprint is None:
+            fingerprint = file_fingerprint(path)
+        return self.load_entry(fingerprint_key(fingerprint, **params), description=path)
+
+    def load_entry(self, key, description=None):
+        """Load the columns of a cache entry by key, or None on a miss."""
+        entry_path = self.entry_path(key)
+        manifest_path = entry_path / MANIFEST_NAME
+        try:
+            manifest = files.load_json(manifest_path)
+            columns = {
+                # Plain ndarray views of memmaps avoid slow per-element
+                # indexing through the np.memmap subclass in pandas.
+                name: np.load(
+                    entry_path / '{}.npy'.format(i),
+                    mmap_mode='r' if self.mmap else None
+                ).view(np.ndarray)
+                for (i, name) in enumerate(manifest['columns'])
+            }
+        except (OSError, ValueError, KeyError):
+            self.stats.misses += 1
+            logger.debug('Cache miss for %s', description or key)
+            return None
+        try:
+            os.utime(manifest_path)  # mark the entry as recently used
+        except OSError as e:  # e.g. a read-only cache; the timestamp is only a hint
+            logger.debug('Could not mark cache entry %s as used: %s', key, e)
+        self.stats.hits += 1
+        logger.debug('Cache hit for %s', description or key)
+        return columns
+
+    def store(self, path, columns, fingerprint=None, **params):
+        """Store a dict of column arrays for a file loaded with the given parameters.
+
+        The fingerprint should be the one taken before the file was read, so
+        that if the file changed while it was read, the columns are stored
+        under the old contents' key, where they will never be loaded.
+        """
+        if fingerprint is None:
+            fingerprint = file_fingerprint(path)
+        self.store_entry(
+            fingerprint_key(fingerprint, **params), columns, source=fingerprint,
+            description=path
+        )
+
+    def store_entry(self, key, columns, source=None, description=None):
+        """Store a dict of column arrays as a cache entry by key.
+
+        The entry is written to a temporary directory and then renamed into
+        place, so concurrent readers never see a partially-written entry.
+        """
+        entry_path = self.entry_path(key)
+        temp_path = self.dir / '{}.tmp-{}'.format(key, os.getpid())
+        try:
+            files.ensure_path(temp_path)
+            for (i, values) in enumerate(columns.values()):
+                np.save(temp_path / '{}.npy'.format(i), np.asarray(values))
+            files.dump_json(
+                {'columns': list(columns.keys()), 'source': source},
+                path=temp_path / MANIFEST_NAME
+            )
+            os.rename(temp_path, entry_path)
+        except OSError as e:
+            # Either another process already stored this entry or the cache
+            # directory is unwritable; both are harmless for the caller.
+            logger.debug(
+                'Could not store cache entry for %s: %s', description or key, e
+            )
+            shutil.rmtree(temp_path, ignore_errors=True)
+            return
+        self.stats.writes += 1
+        if self.max_bytes is not None:
+            self.evict(self.max_bytes)
+
+    def entries(self):
+        """Return (path, last access time, size in bytes) for each cache entry."""
+        if not self.dir.is_dir():
+            return []
+        entries = []
+        for entry_path in self.dir.iterdir():
+            manifest_path = entry_path / MANIFEST_NAME
+            try:
+                last_access = manifest_path.stat().st_mtime
+                size = sum(f.stat().st_size for f in entry_path.iterdir())
+            except OSError:  # temporary or concurrently-evicted entry
+                continue
+            entries.append((entry_path, last_access, size))
+        return entries
+
+    @property
+    def total_bytes(self):
+        """Get the total size of all cache entries."""
+        return sum(size for (_, _, size) in self.entries())
+
+    def evict(self, max_bytes):
+        """Evict least-recently-used entries until the cache fits in max_bytes."""
+        entries = sorted(self.entries(), key=lambda entry: entry[1])
+        total_bytes = sum(size for (_, _, size) in entries)
+        for (entry_path, _, size) in entries:
+            if total_bytes <= max_bytes:
+                break
+            shutil.rmtree(entry_path, ignore_errors=True)
+            total_bytes -= size
+            self.stats.evictions += 1
+            self.stats.evicted_bytes += size
+            logger.debug('Evicted signal cache entry %s', entry_path.name)
+
+    def clear(self):
+        """Remove all cache entries."""
+        self.evict(0)
+
+
+_default_cache = None
+
+
+def default_cache():
+    """Get the shared default signal cache."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = SignalCache()
+    return _default_cache
+
+
+def resolve_cache(cache):
+    """Interpret a cache argument as True (default cache), False/None or a SignalCache."""
+    if cache is True:
+        return default_cache()
+    if cache is False or cache is None:
+        return None
+    return cache
@@ -0,0 +1,209 @@
+"""Live following of signal files which are still being written."""
+import io
+import logging
+
+import numpy as np
+
+import pandas as pd
+
+from ventplotting.files import signals
+from ventplotting.utilities import timeseries
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_CAPACITY = 2 ** 16  # initially preallocated rows
+
+
+# BUFFERS
+
+class SignalBuffer(object):
+    """Growable preallocated buffer of signal columns, appended in blocks.
+
+    Rows live in a contiguous region of preallocated arrays, so columns can
+    always be viewed without copying. When an append doesn't fit after the
+    last row, the rows are moved back to the front of the arrays if they take
+    up at most half of the capacity, or else the arrays are reallocated with
+    double the capacity, so appends take amortized constant time per row.
+    If max_duration is given, rows older than max_duration seconds before the
+    latest row are dropped, bounding the memory used at a steady sampling rate.
+    """
+
+    def __init__(self, dtypes, capacity=DEFAULT_CAPACITY, max_duration=None):
+        """Initialize an empty buffer with a dict of column dtypes, including Time."""
+        self.dtypes = dtypes
+        self.max_duration = max_duration
+        self.columns = {
+            column_name: np.empty(capacity, dtype=dtype)
+            for (column_name, dtype) in dtypes.items()
+        }
+        self.start = 0  # index of the first row in the arrays
+        self.end = 0  # index after the last row in the arrays
+
+    @property
+    def capacity(self):
+        """Get the number of rows which fit in the arrays."""
+        return len(self.columns['Time'])
+
+    def __len__(self):
+        """Get the number of rows in the buffer."""
+        return self.end - self.start
+
+    def clear(self):
+        """Remove all rows from the buffer."""
+        self.start = 0
+        self.end = 0
+
+    def append(self, columns):
+        """Append rows from a dict of column arrays of equal length."""
+        num_rows = len(columns['Time'])
+        if self.end + num_rows > self.capacity:
+            self._make_room(num_rows)
+        for (column_name, values) in columns.items():
+            self.columns[column_name][self.end:self.end + num_rows] = values
+        self.end += num_rows
+        if self.max_duration is not None and len(self):
+            times = self.columns['Time'][self.start:self.end]
+            self.start += int(np.searchsorted(times, times[-1] - self.max_duration))
+
+    def _make_room(self, num_rows):
+        num_live = len(self)
+        capacity = self.capacity
+        if (num_live + num_rows) * 2 > capacity:
+            capacity = max(2 * capacity, 2 * (num_live + num_rows))
+        for (column_name, values) in self.columns.items():
+            live_values = values[self.start:self.end]
+            if capacity != len(values):
+                values = np.empty(capacity, dtype=values.dtype)
+                self.columns[column_name] = values
+            values[:num_live] = live_values  # overlapping moves are safe in NumPy
+        self.start = 0
+        self.end = num_live
+
+    def views(self):
+        """Get views of the rows of each column, valid until the next append."""
+        return {
+            column_name: values[self.start:self.end]
+            for (column_name, values) in self.columns.items()
+        }
+
+
+# LIVE SIGNAL SETS
+
+class LiveSignalSet(signals.RawSignalSet):
+    """Signal set following a signals CSV file as rows are appended to it.
+
+    Each call to poll parses only the complete lines appended since the last
+    poll, starting from the byte offset where the last poll stopped. Times
+    are relative to the first row of the file. Integer setting columns are
+    kept as float32, since rows are parsed before they can all be checked.
+    The dataframe is only rebuilt from the buffer when it is accessed; arrays
+    are views into the buffer, which are valid until the next poll.
+    """
+
+    def __init__(
+            self, path, usecols=None, capacity=DEFAULT_CAPACITY, max_duration=None
+    ):
+        """Initialize the signal set to follow a file, keeping the last max_duration s.
+
+        Nothing is read until poll is called.
+        """
+        super().__init__()
+        self.path = path
+        self.usecols = usecols
+        self.initial_capacity = capacity
+        self.max_duration = max_duration
+        self.offset = None  # byte offset after the last parsed line
+        self.raw_names = None
+        self.selected_names = None
+        self.time_origin = None
+        self.buffer = None
+
+    # Polling
+
+    def poll(self):
+        """Parse any complete lines appended to the file since the last poll.
+
+        If the file has been truncated or replaced by a shorter one, it is
+        followed again from its start. Returns the number of new rows.
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(0, io.SEEK_END)
+                size = f.tell()
+                if self.offset is not None and size < self.offset:
+                    logger.info('%s was truncated, following it again', self.path)
+                    self.offset = None
+                if self.offset is None:
+                    f.seek(0)
+                    if not self._read_header(f.readline()):
+                        return 0
+                f.seek(self.offset)
+                data = f.read(size - self.offset)
+        except FileNotFoundError:
+            return 0
+        complete_size = data.rfind(b'\n') + 1
+        if complete_size == 0:
+            return 0
+        self.offset += complete_size
+        chunk = pd.read_csv(
+            io.BytesIO(data[:complete_size]), header=None, names=self.raw_names,
+            usecols=self.selected_names, dtype=signals.parse_dtypes(self.selected_names),
+            engine='c'
+        )
+        if not len(chunk):
+            return 0
+        columns = {
+            signals.rename_column(raw_name): chunk[raw_name].to_numpy()
+            for raw_name in self.selected_names
+        }
+        if self.time_origin is None:
+            self.time_origin = columns['Time'][0]
+        columns['Time'] = columns['Time'] - self.time_origin
+        self.buffer.append(columns)
+        self._df = None
+        return len(chunk)
+
+    def _read_header(self, line):
+        if not line.endswith(b'\n'):  # the header is still being written
+            return False
+        self.raw_names = pd.read_csv(io.BytesIO(line), nrows=0).columns.tolist()
+        self.selected_names = signals.select_columns(
+            self.raw_names, usecols=self.usecols
+        )
+        dtypes = {
+            signals.rename_column(raw_name): dtype for (raw_name, dtype)
+            in signals.parse_dtypes(self.selected_names).items()
+        }
+        for raw_name in self.selected_names:
+            dtypes.setdefault(signals.rename_column(raw_name), 'float64')
+        self.buffer = SignalBuffer(
+            dtypes, capacity=self.initial_capacity, max_duration=self.max_duration
+        )
+        self.time_origin = None
+        self._df = None
+        self.offset = len(line)
+        return True
+
+    # Access
+
+    @property
+    def df(self):
+        """Get a dataframe of the buffered signals, indexed by time."""
+        if self._df is None and self.buffer is not None:
+            df = pd.DataFrame(self.buffer.views(), copy=False)
+            df.index = timeseries.make_time_index(df.Time)
+            self._df = df
+        return self._df
+
+    @df.setter
+    def df(self, df):
+        self._df = df
+
+    @property
+    def arrays(self):
+        """Get views of the buffered columns, valid until the next poll."""
+        if self.buffer is None:
+            return {}
+        return self.buffer.views()
@@ -0,0 +1,78 @@
+"""On-disk store of derived analysis results."""
+import hashlib
+import json
+import os
+import pathlib
+
+import ventplotting
+from ventplotting.files import cache
+
+
+RESULTS_FORMAT_VERSION = 1  # increment whenever the layout of stored results changes
+RESULTS_DIR_ENV_VAR = 'VENTPLOTTING_RESULTS_DIR'
+DEFAULT_RESULTS_DIR = pathlib.Path.home() / '.cache' / 'ventplotting' / 'results'
+DEFAULT_MAX_BYTES = 4 * 1024 ** 3  # 4 GiB
+
+
+def result_key(signature):
+    """Hash the signature of a stage's inputs and the code version into a store key."""
+    key_data = {
+        'version': RESULTS_FORMAT_VERSION, 'package': ventplotting.__version__,
+        'signature': signature
+    }
+    key_string = json.dumps(key_data, sort_keys=True, default=str)
+    return hashlib.sha1(key_string.encode('utf-8')).hexdigest()
+
+
+# STORE
+
+class ResultStore(cache.SignalCache):
+    """Directory of stored results of analysis stages, as memory-mappable columns.
+
+    Entries are keyed by a signature of a stage's inputs (the fingerprints of
+    the source data files, and the names, versions, source code fingerprints
+    and parameters of the stage and of all stages upstream of it) together
+    with the package version, so editing the code of a stage invalidates its
+    entries and those downstream of it. Entries are written atomically and
+    evicted as in SignalCache.
+    """
+
+    def __init__(self, dir=None, max_bytes=DEFAULT_MAX_BYTES, mmap=True):
+        """Initialize the store in the given directory.
+
+        If dir is None, the directory is taken from the VENTPLOTTING_RESULTS_DIR
+        environment variable, or else from DEFAULT_RESULTS_DIR.
+        """
+        if dir is None:
+            dir = os.environ.get(RESULTS_DIR_ENV_VAR, DEFAULT_RESULTS_DIR)
+        super().__init__(dir=dir, max_bytes=max_bytes, mmap=mmap)
+
+    def load_result(self, signature):
+        """Load the stored columns of a result as a dict of arrays, or None on a miss."""
+        return self.load_entry(result_key(signature), description=signature[0])
+
+    def store_result(self, signature, columns):
+        """Store the columns of a result as a dict of arrays."""
+        self.store_entry(
+            result_key(signature), columns, source=signature, description=signature[0]
+        )
+
+
+_default_store = None
+
+
+def default_store():
+    """Get the shared default result store."""
+    global _default_store
+    if _default_store is None:
+        _default_store = ResultStore()
+    return _default_store
+
+
+def resolve_store(store):
+    """Interpret a store argument as True (default store), False/None or a ResultStore."""
+    if store is True:
+        return default_store()
+    if store is False or store is None:
+        return None
+    return store
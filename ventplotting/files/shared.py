@@ -0,0 +1,285 @@
+"""Zero-copy transfer of column arrays between processes through shared memory."""
+import json
+import logging
+import mmap
+import os
+import pathlib
+import secrets
+import shutil
+import tempfile
+import weakref
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import pandas as pd
+
+from ventplotting.files import signals
+from ventplotting.utilities import files
+
+
+logger = logging.getLogger(__name__)
+
+
+SHARED_DIR_ENV_VAR = 'VENTPLOTTING_SHARED_DIR'
+SHM_DIR = pathlib.Path('/dev/shm')  # memory-backed filesystem on Linux
+EXPORT_PREFIX = 'ventplotting-'
+SEGMENT_PREFIX = 'vp_'  # short, as macOS limits segment names to 31 characters
+
+
+def default_shared_dir():
+    """Get the directory for exported arrays.
+
+    The directory is taken from the VENTPLOTTING_SHARED_DIR environment
+    variable, or else is /dev/shm if it exists (so exports never touch the
+    disk), or else the temporary directory.
+    """
+    shared_dir = os.environ.get(SHARED_DIR_ENV_VAR)
+    if shared_dir is not None:
+        return pathlib.Path(shared_dir)
+    if SHM_DIR.is_dir() and os.access(SHM_DIR, os.W_OK):
+        return SHM_DIR
+    return pathlib.Path(tempfile.gettempdir())
+
+
+# TRANSFER
+
+def export_arrays(arrays, dir=None):
+    """Write a dict of arrays to shared memory for import by another process.
+
+    Each array is saved as a .npy file in a new subdirectory of dir (by
+    default, default_shared_dir()). Returns a small picklable export
+    descriptor, to be passed to import_arrays exactly once.
+    """
+    if dir is None:
+        dir = default_shared_dir()
+    files.ensure_path(dir)
+    export_path = pathlib.Path(tempfile.mkdtemp(prefix=EXPORT_PREFIX, dir=dir))
+    try:
+        for (i, values) in enumerate(arrays.values()):
+            np.save(export_path / '{}.npy'.format(i), np.asarray(values))
+    except BaseException:
+        shutil.rmtree(export_path, ignore_errors=True)
+        raise
+    return {'path': str(export_path), 'names': list(arrays.keys())}
+
+
+def import_arrays(export):
+    """Memory-map a dict of arrays exported by export_arrays, without copying them.
+
+    The exported files are removed as soon as they are mapped; their memory
+    is released once all of the returned arrays (and views of them) are
+    garbage-collected. The arrays are read-only.
+    """
+    export_path = pathlib.Path(export['path'])
+    try:
+        arrays = {
+            # Plain ndarray views of memmaps, as in the signal cache
+            name: np.load(
+                export_path / '{}.npy'.format(i), mmap_mode='r'
+            ).view(np.ndarray)
+            for (i, name) in enumerate(export['names'])
+        }
+    finally:
+        discard_export(export)
+    return arrays
+
+
+def discard_export(export):
+    """Remove the files of an export which will not be imported."""
+    try:
+        shutil.rmtree(export['path'])
+    except OSError as e:  # e.g. mapped files can't be removed on Windows
+        logger.debug('Could not remove shared arrays %s: %s', export['path'], e)
+
+
+# SHARED SIGNAL SETS
+
+def segment_name(token, label):
+    """Name a shared memory segment of this process."""
+    return '{}{}_{}_{}'.format(SEGMENT_PREFIX, os.getpid(), token, label)
+
+
+def segment_pid(name):
+    """Get the ID of the process which created a segment, or None if not ours."""
+    if not name.startswith(SEGMENT_PREFIX):
+        return None
+    try:
+        return int(name[len(SEGMENT_PREFIX):].split('_')[0])
+    except ValueError:
+        return None
+
+
+def pid_exists(pid):
+    """Check whether a process with the given ID is running."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def remove_stale_segments():
+    """Unlink segments whose creating process has died without unlinking them.
+
+    Normally the resource tracker of a crashed process unlinks its segments,
+    but it may be killed along with the process (e.g. by the OOM killer or a
+    container shutdown). Only possible where segments are listed in /dev/shm.
+    Returns the names of the removed segments.
+    """
+    if not SHM_DIR.is_dir():
+        return []
+    removed = []
+    for path in SHM_DIR.glob('{}*'.format(SEGMENT_PREFIX)):
+        pid = segment_pid(path.name)
+        if pid is None or pid_exists(pid):
+            continue
+        try:
+            path.unlink()
+            removed.append(path.name)
+        except OSError as e:
+            logger.debug('Could not remove stale segment %s: %s', path.name, e)
+    if removed:
+        logger.info('Removed %d stale shared memory segments', len(removed))
+    return removed
+
+
+def unlink_segments(segments):
+    """Close and unlink shared memory segments, ignoring already-removed ones."""
+    for segment in segments:
+        segment.close()
+        try:
+            segment.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class SharedSignalSet(object):
+    """Publication of the columns of a RawSignalSet in shared memory.
+
+    Each column (including the time index) is copied once into its own
+    multiprocessing.shared_memory segment, and a small header segment holds
+    the schema: the name, dtype, length and segment of each column, and the
+    source identity of the signal set. Other processes, including unrelated
+    ones such as notebook kernels, attach to it by the name of the header
+    segment with attach_signal_set, getting zero-copy views of the columns.
+
+    The creating process owns the segments and unlinks them in close (also
+    called on exiting a with block, on garbage collection and at interpreter
+    exit). If the process crashes, its resource tracker unlinks them, and
+    remove_stale_segments unlinks any left behind by killed processes.
+    Attached processes keep their views valid after the segments are
+    unlinked, until the views are garbage-collected.
+    """
+
+    def __init__(self, raw_signal_set):
+        """Copy the columns of a signal set into new shared memory segments."""
+        remove_stale_segments()
+        token = secrets.token_hex(4)
+        df = raw_signal_set.df
+        columns = {
+            column_name: raw_signal_set.get_signal(column_name).to_numpy()
+            for column_name in (
+                list(df.columns) + (
+                    list(raw_signal_set.settings_runs.keys())
+                    if raw_signal_set.settings_compressed else []
+                )
+            )
+        }
+        columns['_index'] = df.index.to_numpy().view(np.int64)
+        self.segments = []
+        self._finalizer = weakref.finalize(self, unlink_segments, self.segments)
+        schema = {'columns': [], 'source': raw_signal_set.source}
+        try:
+            for (i, (column_name, values)) in enumerate(columns.items()):
+                values = np.ascontiguousarray(values)
+                if values.dtype.hasobject:
+                    raise ValueError(
+                        'Column {} of dtype {} cannot be shared!'
+                        .format(column_name, values.dtype)
+                    )
+                segment = self._create_segment(segment_name(token, i), values.nbytes)
+                np.ndarray(values.shape, values.dtype, buffer=segment.buf)[:] = values
+                schema['columns'].append({
+                    'name': column_name, 'dtype': values.dtype.str,
+                    'length': len(values), 'segment': segment.name
+                })
+            header = json.dumps(schema).encode('utf-8')
+            segment = self._create_segment(segment_name(token, 'h'), len(header))
+            segment.buf[:len(header)] = header
+        except BaseException:
+            self.close()
+            raise
+        self.name = segment.name  # name of the header segment, to pass to workers
+        self.nbytes = sum(values.nbytes for values in columns.values())
+
+    def _create_segment(self, name, size):
+        segment = shared_memory.SharedMemory(name=name, create=True, size=max(size, 1))
+        self.segments.append(segment)
+        return segment
+
+    def close(self):
+        """Unlink the segments, so their memory is freed once no process maps them."""
+        self._finalizer()
+
+    @property
+    def closed(self):
+        """Check whether the segments have been unlinked."""
+        return not self._finalizer.alive
+
+    def __enter__(self):
+        """Enter a context which closes the shared signal set on exit."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Close the shared signal set."""
+        self.close()
+
+
+_attached_segments = []  # segments attached without a /dev/shm path, never closed
+
+
+def map_segment(name):
+    """Map a shared memory segment read-only, returning a buffer.
+
+    On Linux, segments are files in /dev/shm which are mapped directly, so
+    the mapping is released when the last array viewing it is garbage-
+    collected and attaching doesn't register the segment with this
+    process's resource tracker (which would unlink it when this process
+    exits). Elsewhere, segments are attached through SharedMemory and stay
+    mapped until this process exits.
+    """
+    path = SHM_DIR / name
+    if path.exists():
+        with open(path, 'rb') as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    segment = shared_memory.SharedMemory(name=name)
+    _attached_segments.append(segment)
+    return segment.buf.toreadonly()
+
+
+def attach_signal_set(name):
+    """Get a RawSignalSet of read-only zero-copy views of a SharedSignalSet.
+
+    The name is the name of the header segment of the shared signal set.
+    The dataframe and its time index are views of the shared segments, and
+    the source identity of the shared signal set is kept, so analysis
+    results can still be loaded from the result store.
+    """
+    header = bytes(map_segment(name)).rstrip(b'\0')
+    schema = json.loads(header.decode('utf-8'))
+    columns = {
+        column['name']: np.frombuffer(
+            map_segment(column['segment']), dtype=column['dtype'], count=column['length']
+        )
+        for column in schema['columns']
+    }
+    index = columns.pop('_index').view('timedelta64[ns]')
+    df = pd.DataFrame(columns, copy=False)
+    df.index = pd.TimedeltaIndex(index, name='Time', copy=False)
+    raw_signal_set = signals.RawSignalSet()
+    raw_signal_set.df = df
+    raw_signal_set.source = schema['source']
+    return raw_signal_set
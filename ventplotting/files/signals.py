@@ -1,8 +1,30 @@
 """Support for signals in input files."""
+import numpy as np
+
 import pandas as pd
 
+from ventplotting.files import cache as signal_cache
+from ventplotting.utilities import runs
+from ventplotting.utilities import timeseries
+
 
 SIGNAL_START_ROW = 0  # zero-indexed
+SCHEMA_VERSION = 1  # increment whenever COLUMN_DTYPES or parsing changes
+
+# Parsed dtypes of known columns, by their renamed names. Time must stay
+# float64 to preserve sub-millisecond resolution of Unix timestamps.
+COLUMN_DTYPES = {
+    'Time': 'float64',
+    'Paw': 'float32',
+    'Flow': 'float32',
+    'Volume': 'float32',
+    'Vt': 'int16',
+    'Ti': 'float32',
+    'RR': 'int16',
+    'PEEP': 'int16'
+}
+WAVEFORM_COLUMNS = ['Paw', 'Flow', 'Volume']
+SETTING_COLUMNS = ['Vt', 'Ti', 'RR', 'PEEP']
 
 
 def rename_column(column_name):
@@ -26,19 +48,139 @@ def rename_column(column_name):
     return column_name
 
 
+# PARSING
+
+def csv_engine():
+    """Return the fastest available pandas CSV parser engine."""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return 'c'
+    return 'pyarrow'
+
+
+def read_csv_header(path):
+    """Read the raw column names of a signals CSV file."""
+    return pd.read_csv(path, header=SIGNAL_START_ROW, nrows=0).columns.tolist()
+
+
+def parse_dtype(dtype):
+    """Get the dtype used to parse a column which will be converted to dtype.
+
+    Integer columns are parsed as floats because loggers may write them with
+    a decimal point (e.g. "300.0"), and are converted afterwards.
+    """
+    if np.dtype(dtype).kind in 'iu':
+        return 'float32'
+    return dtype
+
+
+def convert_integer_columns(df):
+    """Convert float-parsed integer columns to their schema dtypes, in place.
+
+    Columns with missing or fractional values are left as floats.
+    """
+    for (column_name, dtype) in COLUMN_DTYPES.items():
+        if column_name not in df.columns or np.dtype(dtype).kind not in 'iu':
+            continue
+        values = df[column_name].to_numpy()
+        if np.all(np.isfinite(values)) and np.all(values == np.round(values)):
+            df[column_name] = values.astype(dtype)
+
+
+def select_columns(raw_names, usecols=None):
+    """Select the raw column names to parse, given renamed names in usecols.
+
+    The Time column is always selected.
+    """
+    if usecols is None:
+        return list(raw_names)
+    usecols = set(usecols) | {'Time'}
+    return [name for name in raw_names if rename_column(name) in usecols]
+
+
+def parse_dtypes(raw_names):
+    """Get the parsing dtypes of the known columns among raw column names."""
+    return {
+        name: parse_dtype(COLUMN_DTYPES[rename_column(name)])
+        for name in raw_names if rename_column(name) in COLUMN_DTYPES
+    }
+
+
+def read_csv(path, usecols=None, engine=None):
+    """Read a signals CSV file into a dataframe with renamed, typed columns.
+
+    Known columns are parsed with the dtypes in COLUMN_DTYPES. If usecols is
+    given, only those columns (by their renamed names) are parsed; the Time
+    column is always parsed. If engine is None, the fastest available pandas
+    parser engine is used.
+    """
+    raw_names = select_columns(read_csv_header(path), usecols=usecols)
+    dtypes = parse_dtypes(raw_names)
+    df = pd.read_csv(
+        path, header=SIGNAL_START_ROW, usecols=raw_names, dtype=dtypes,
+        engine=engine if engine is not None else csv_engine()
+    )
+    df = df[raw_names]  # some engines don't preserve column order with usecols
+    return normalize_columns(df)
+
+
+def normalize_columns(df):
+    """Rename the raw columns of a parsed dataframe and convert their dtypes."""
+    df = df.rename(rename_column, axis='columns')
+    convert_integer_columns(df)
+    return df
+
+
 class RawSignalSet(object):
     """Raw signal set loading/access."""
 
     def __init__(self):
         """Make an empty signal set object."""
         self.df = None  # a Pandas dataframe of the signals
+        self._arrays = None  # cached NumPy views of the columns of df
+        self._arrays_df = None  # the dataframe which _arrays was cached from
+        self._settings_runs = None  # cached run-length encodings of setting columns
+        self._settings_runs_df = None  # the dataframe which _settings_runs is from
+        self.settings_compressed = False  # whether setting columns were dropped from df
+        self.source = None  # identity of the loaded file contents, if loaded from a file
+        self.time_offset = 0.0  # s, subtracted from times when plotting
+
+    def load_csv(self, path, usecols=None, cache=True, engine=None):
+        """Load signal set from a file path.
+
+        If usecols is given, only those columns (and Time) are loaded.
+        The parsed signals are stored in a binary on-disk cache, so that
+        repeated loads of an unchanged file skip parsing. The cache may be
+        True (the default cache), False (no caching) or a SignalCache.
+        """
+        if usecols is not None:
+            usecols = sorted(set(usecols) | {'Time'})
+        cache_params = {'usecols': usecols, 'schema': SCHEMA_VERSION}
+        # Fingerprint the file before reading it, so later changes aren't missed
+        source = {'file': signal_cache.file_fingerprint(path), **cache_params}
+        cache = signal_cache.resolve_cache(cache)
+        columns = None if cache is None else cache.load(
+            path, fingerprint=source['file'], **cache_params
+        )
+        if columns is not None:
+            self.df = pd.DataFrame(columns, copy=False)
+        else:
+            self.df = read_csv(path, usecols=usecols, engine=engine)
+            self.df['Time'] -= self.df.Time.min()
+            if cache is not None:
+                cache.store(path, {
+                    name: self.df[name].to_numpy() for name in self.df.columns
+                }, fingerprint=source['file'], **cache_params)
+        self.load_df(self.df)
+        self.source = source
 
-    def load_csv(self, path):
-        """Load signal set from a file path."""
-        self.df = pd.read_csv(path, header=SIGNAL_START_ROW)
-        self.df.rename(rename_column, axis='columns', inplace=True)
-        self.df['Time'] -= self.df.Time.min()
-        self.df.index = pd.to_timedelta(self.df.Time, unit='s')
+    def load_df(self, df):
+        """Load signal set from a dataframe of renamed columns with relative times."""
+        self.df = df
+        self.df.index = timeseries.make_time_index(self.df.Time)
+        self.settings_compressed = False
+        self.source = None
 
     @property
     def times(self):
@@ -55,9 +197,177 @@ class RawSignalSet(object):
         """Get the number of samples."""
         return len(self.df)
 
+    @property
+    def arrays(self):
+        """Get NumPy arrays (views, not copies) of each column."""
+        if self._arrays is None or self._arrays_df is not self.df:
+            self._arrays = {
+                column_name: self.df[column_name].to_numpy()
+                for column_name in self.df.columns
+            }
+            self._arrays_df = self.df
+        return self._arrays
+
+    @property
+    def time_array(self):
+        """Get the relative times as a sorted float64 NumPy array."""
+        return self.arrays['Time']
+
+    def interval_bounds(self, start_time=None, end_time=None):
+        """Get the sample index bounds of an interval between two times in seconds.
+
+        Start and end times may also be arrays of multiple intervals, in which
+        case arrays of bounds are returned from one vectorized search.
+        """
+        return timeseries.interval_bounds(
+            self.time_array, start_time=start_time, end_time=end_time
+        )
+
+    def slice(self, start_time=None, end_time=None):
+        """Get the rows of the dataframe between two times in seconds, inclusive."""
+        (start, end) = self.interval_bounds(start_time=start_time, end_time=end_time)
+        return self.df.iloc[start:end]
+
+    def slice_arrays(self, start_time=None, end_time=None, column_names=None):
+        """Get views of column arrays between two times in seconds, inclusive."""
+        (start, end) = self.interval_bounds(start_time=start_time, end_time=end_time)
+        return self._slice_arrays(start, end, column_names=column_names)
+
+    def slice_windows(self, start_times, end_times, column_names=None):
+        """Get views of column arrays for each of many intervals between times.
+
+        Returns a list with a dict of column array views for each interval.
+        The bounds of all intervals are found in one vectorized search.
+        """
+        (starts, ends) = self.interval_bounds(
+            start_time=np.asarray(start_times, dtype='float64'),
+            end_time=np.asarray(end_times, dtype='float64')
+        )
+        return [
+            self._slice_arrays(start, end, column_names=column_names)
+            for (start, end) in zip(starts, ends)
+        ]
+
+    def window(self, start_time=None, end_time=None, realign_time=False):
+        """Get a view of the samples between two times in seconds, inclusive.
+
+        The view references the arrays of this signal set instead of copying
+        them. If realign_time is True, the view's time_offset is set so that
+        plots of it start at time zero; its times are otherwise unchanged.
+        """
+        (start, end) = self.interval_bounds(start_time=start_time, end_time=end_time)
+        return SignalWindow(self, start, end, realign_time=realign_time)
+
+    def _slice_arrays(self, start, end, column_names=None):
+        arrays = self.arrays
+        if column_names is None:
+            column_names = arrays.keys()
+        return {
+            column_name: arrays[column_name][start:end]
+            for column_name in column_names
+        }
+
+    @property
+    def settings_runs(self):
+        """Get run-length encodings of the setting columns, by column name."""
+        if self.settings_compressed:
+            return self._settings_runs
+        if self._settings_runs is None or self._settings_runs_df is not self.df:
+            arrays = self.arrays
+            self._settings_runs = {
+                column_name: runs.RunLengthEncoding().encode(
+                    arrays['Time'], arrays[column_name]
+                )
+                for column_name in SETTING_COLUMNS if column_name in arrays
+            }
+            self._settings_runs_df = self.df
+        return self._settings_runs
+
+    def compress_settings(self):
+        """Replace the setting columns of the dataframe with their run-length encodings.
+
+        Afterwards, settings are only available from settings_runs and
+        get_signal, which expands them back to full columns.
+        """
+        settings_runs = self.settings_runs
+        self.df = self.df.drop(columns=list(settings_runs.keys()))
+        self._settings_runs = settings_runs
+        self.settings_compressed = True
+
+    def memory_usage(self):
+        """Get the memory usage in bytes of each column and the index.
+
+        Compressed setting columns are counted by the size of their encodings.
+        """
+        usage = self.df.memory_usage(index=True, deep=True)
+        if self.settings_compressed:
+            for (column_name, encoding) in self._settings_runs.items():
+                usage[column_name] = encoding.nbytes
+        return usage
+
     def get_signal(self, column_name):
         """Get a signal by its name number.
 
         Note that channel numbers are one-indexed.
         """
+        if self.settings_compressed and column_name in self._settings_runs:
+            return pd.Series(
+                self._settings_runs[column_name].decode(), index=self.df.index,
+                name=column_name
+            )
         return self.df[column_name]
+
+
+class SignalWindow(RawSignalSet):
+    """View of a contiguous range of samples of a RawSignalSet, without copies.
+
+    Arrays are views into the arrays of the parent signal set, and the
+    dataframe is only made (as a copy-on-write slice of the parent's
+    dataframe) when it is accessed. Times stay in the parent's time frame;
+    any realignment of times is given by time_offset and is only applied by
+    plotting functions. A window keeps the parent's data alive even if the
+    parent later loads new data. Setting a new dataframe on a window makes
+    it a standalone signal set.
+    """
+
+    def __init__(self, parent, start, end, realign_time=False):
+        """Make a view of the samples parent[start:end]."""
+        super().__init__()
+        if isinstance(parent, SignalWindow) and parent.parent is not None:
+            # Windows of windows are views of the original signal set
+            (start, end) = (parent.start + start, parent.start + end)
+            parent = parent.parent
+        self.parent = parent
+        self.start = start
+        self.end = end
+        self._parent_df = parent.df
+        self._window_arrays = parent._slice_arrays(start, end)
+        self.settings_compressed = parent.settings_compressed
+        if parent.settings_compressed:
+            self._settings_runs = {
+                column_name: encoding.slice(start, end, parent.time_array)
+                for (column_name, encoding) in parent.settings_runs.items()
+            }
+        if realign_time and end > start:
+            self.time_offset = float(self._window_arrays['Time'][0])
+
+    @property
+    def df(self):
+        """Get a dataframe of the samples of the window."""
+        if self._df is None and self.parent is not None:
+            self._df = self._parent_df.iloc[self.start:self.end]
+        return self._df
+
+    @df.setter
+    def df(self, df):
+        self._df = df
+        if df is not None:
+            self.parent = None
+            self._window_arrays = None
+
+    @property
+    def arrays(self):
+        """Get NumPy views of each column of the window."""
+        if self.parent is not None:
+            return self._window_arrays
+        return super().arrays
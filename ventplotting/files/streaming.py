@@ -0,0 +1,210 @@
+"""Streaming of signal files which are too large to load at once."""
+import logging
+
+import numpy as np
+
+import pandas as pd
+
+from ventplotting.files import cache as signal_cache
+from ventplotting.files import signals
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_CHUNK_ROWS = 100000
+DEFAULT_INDEX_STRIDE = 10000  # rows between entries of the byte offset index
+INDEX_BLOCK_BYTES = 16 * 1024 ** 2  # bytes read at a time while building the index
+
+
+# BYTE OFFSET INDEX
+
+class OffsetIndex(object):
+    """Sparse index from row timestamps to byte offsets in a signals CSV file."""
+
+    def __init__(self, offsets=None, times=None):
+        """Make an index from sorted byte offsets and raw timestamps of rows."""
+        self.offsets = offsets  # byte offsets of the starts of indexed rows
+        self.times = times  # raw (not rebased) timestamps of indexed rows
+
+    def build(self, path, stride=DEFAULT_INDEX_STRIDE):
+        """Build the index by scanning a file for line breaks.
+
+        Every stride-th data row is indexed, starting with the first data row.
+        Only the Time fields of indexed rows are parsed.
+        """
+        offsets = []
+        with open(path, 'rb') as f:
+            f.readline()  # skip the header
+            row_start = f.tell()  # byte offset of the next row to be terminated
+            row_number = 0
+            while True:
+                block_start = f.tell()
+                block = f.read(INDEX_BLOCK_BYTES)
+                if not block:
+                    break
+                line_ends = block_start + np.flatnonzero(
+                    np.frombuffer(block, dtype=np.uint8) == ord('\n')
+                )
+                if not len(line_ends):
+                    continue
+                # Each line break terminates the row starting after the previous one
+                row_starts = np.concatenate(([row_start], line_ends[:-1] + 1))
+                row_numbers = row_number + np.arange(len(row_starts))
+                offsets.append(row_starts[row_numbers % stride == 0])
+                row_number += len(row_starts)
+                row_start = line_ends[-1] + 1
+            self.offsets = np.concatenate(offsets or [[]]).astype(np.int64)
+            self.times = np.array([
+                self._read_time(f, offset) for offset in self.offsets
+            ], dtype='float64')
+        # Drop offsets of trailing blank or partially-written lines
+        valid = np.isfinite(self.times)
+        self.offsets = self.offsets[valid]
+        self.times = self.times[valid]
+        return self
+
+    @staticmethod
+    def _read_time(f, offset):
+        f.seek(offset)
+        try:
+            return float(f.readline().split(b',', 1)[0])
+        except ValueError:
+            return np.nan
+
+    @property
+    def time_origin(self):
+        """Get the raw timestamp of the first row of the file."""
+        return self.times[0]
+
+    def offset_before(self, time):
+        """Get the byte offset of the last indexed row at or before a relative time."""
+        raw_time = self.time_origin + time
+        i = max(int(np.searchsorted(self.times, raw_time, side='right')) - 1, 0)
+        return int(self.offsets[i])
+
+    def as_arrays(self):
+        """Return the index as a dict of arrays."""
+        return {'offsets': self.offsets, 'times': self.times}
+
+
+def load_offset_index(path, stride=DEFAULT_INDEX_STRIDE, cache=True):
+    """Load the byte offset index of a file, building and caching it if needed."""
+    cache = signal_cache.resolve_cache(cache)
+    cache_params = {'kind': 'offset_index', 'stride': stride}
+    # Fingerprint the file before reading it, so later changes aren't missed
+    fingerprint = signal_cache.file_fingerprint(path)
+    arrays = None if cache is None else cache.load(
+        path, fingerprint=fingerprint, **cache_params
+    )
+    if arrays is not None:
+        return OffsetIndex(np.asarray(arrays['offsets']), np.asarray(arrays['times']))
+    logger.debug('Building byte offset index for %s', path)
+    index = OffsetIndex().build(path, stride=stride)
+    if cache is not None:
+        cache.store(path, index.as_arrays(), fingerprint=fingerprint, **cache_params)
+    return index
+
+
+def read_time_origin(path):
+    """Read the raw timestamp of the first row of a file."""
+    with open(path, 'rb') as f:
+        f.readline()  # skip the header
+        return float(f.readline().split(b',', 1)[0])
+
+
+# CHUNKS
+
+def iter_chunks(
+        path, chunk_rows=DEFAULT_CHUNK_ROWS, start_time=None, end_time=None,
+        usecols=None, index=None, cache=True
+):
+    """Iterate over dataframes of consecutive rows of a signals file.
+
+    Times are rebased relative to the first row of the whole file, and only
+    rows between start_time and end_time (inclusive, in seconds) are yielded.
+    If start_time is given, parsing starts from the nearest preceding row in
+    the byte offset index (loaded with load_offset_index if index is None).
+    """
+    raw_names = signals.read_csv_header(path)
+    selected_names = signals.select_columns(raw_names, usecols=usecols)
+    dtypes = signals.parse_dtypes(selected_names)
+    if start_time is not None and index is None:
+        index = load_offset_index(path, cache=cache)
+    time_origin = index.time_origin if index is not None else read_time_origin(path)
+
+    with open(path, 'rb') as f:
+        if start_time is not None:
+            f.seek(index.offset_before(start_time))
+        else:
+            f.readline()  # skip the header
+        reader = pd.read_csv(
+            f, header=None, names=raw_names, usecols=selected_names,
+            dtype=dtypes, chunksize=chunk_rows, engine='c'
+        )
+        for chunk in reader:
+            chunk = signals.normalize_columns(chunk[selected_names])
+            chunk['Time'] -= time_origin
+            times = chunk.Time.to_numpy()
+            start = 0 if start_time is None else np.searchsorted(times, start_time)
+            end = len(times) if end_time is None else np.searchsorted(
+                times, end_time, side='right'
+            )
+            if start < end:
+                yield chunk.iloc[start:end].reset_index(drop=True)
+            if end < len(times):
+                break
+
+
+def iter_windows(
+        path, window_rows=None, window_duration=None, start_time=None,
+        end_time=None, usecols=None, chunk_rows=DEFAULT_CHUNK_ROWS, index=None,
+        cache=True
+):
+    """Iterate over fixed-size windows of a signals file as RawSignalSets.
+
+    Exactly one of window_rows or window_duration (in seconds) must be given.
+    Duration windows are aligned to start_time (or to the start of the file),
+    and empty windows are skipped. Times are rebased relative to the first row
+    of the whole file, so windows can be compared with each other.
+    """
+    if (window_rows is None) == (window_duration is None):
+        raise ValueError('Exactly one of window_rows or window_duration must be given!')
+    if window_rows is not None:
+        chunk_rows = window_rows
+
+    window_end = None
+    if window_duration is not None:
+        window_end = (start_time if start_time is not None else 0) + window_duration
+
+    pending = None
+    for chunk in iter_chunks(
+        path, chunk_rows=chunk_rows, start_time=start_time, end_time=end_time,
+        usecols=usecols, index=index, cache=cache
+    ):
+        pending = chunk if pending is None else pd.concat(
+            [pending, chunk], ignore_index=True
+        )
+        while len(pending):
+            if window_rows is not None:
+                if len(pending) < window_rows:
+                    break
+                split = window_rows
+            else:
+                if pending.Time.iloc[-1] < window_end:
+                    break
+                split = np.searchsorted(pending.Time.to_numpy(), window_end)
+                window_end += window_duration
+                if split == 0:
+                    continue
+            yield make_signal_set(pending.iloc[:split])
+            pending = pending.iloc[split:].reset_index(drop=True)
+    if pending is not None and len(pending):
+        yield make_signal_set(pending)
+
+
+def make_signal_set(df):
+    """Make a RawSignalSet from a dataframe of rows."""
+    raw_signal_set = signals.RawSignalSet()
+    raw_signal_set.load_df(df.copy())
+    return raw_signal_set
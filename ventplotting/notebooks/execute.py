@@ -1,5 +1,13 @@
 """Support for easy execution of notebooks using Papermill."""
+import asyncio
+import collections
+import concurrent.futures
+import json
+import os
 import pathlib
+import signal
+import sys
+import time
 
 import IPython.display as ipd
 
@@ -7,39 +15,225 @@ import ipywidgets as ipw
 
 import joblib as jl
 
+import nbformat
+
 import papermill as pm
 
+from ventplotting.files import shared
+from ventplotting.files import signals
+from ventplotting.notebooks import kernels
+from ventplotting.notebooks import manifest as build_manifest
+from ventplotting.notebooks import scheduling
 from ventplotting.notebooks.display import print_md
+from ventplotting.utilities import files
+
+
+BATCH_SUMMARY_NAME = 'batch_summary.json'
 
 
 def execute(
     template_path, output_name, cwd=None, output_dir=None, parameters={}, engine_kwargs={}
 ):
-    """Run a parameterized notebook template using papermill."""
+    """Run a parameterized notebook template using papermill.
+
+    Returns the duration of the run, in seconds.
+    """
     if output_dir is None:
         output_dir = ''
     output_path = pathlib.Path(output_dir) / output_name
+    start = time.perf_counter()
     pm.execute_notebook(
-        str(template_path), str(output_path), cwd=str(cwd), parameters=parameters,
+        str(template_path), str(output_path),
+        cwd=None if cwd is None else str(cwd), parameters=parameters,
         **engine_kwargs
     )
+    return time.perf_counter() - start
+
+
+def execute_measured(
+    template_path, output_name, cwd=None, output_dir=None, parameters={},
+    engine_kwargs={}, kernel_pool=None, queued=None
+):
+    """Run a parameterized notebook template, measuring its resource usage.
+
+    The notebook is run on a kernel from kernel_pool if given, or else on a
+    new kernel. Returns a dict with the wall time of the job in seconds, its
+    queue wait since the time.time() at which it was queued (if given), and
+    the peak RSS of its kernel in bytes. Pooled kernels report their peak
+    RSS since they were started.
+    """
+    start = time.time()
+    if kernel_pool is None:
+        kernel_name = engine_kwargs.get('kernel_name')
+        if kernel_name is None:
+            kernel_name = template_kernel_name(template_path)
+        kernel_context = kernels.standalone_kernel(kernel_name=kernel_name, cwd=cwd)
+    else:
+        kernel_context = kernel_pool.kernel(cwd=cwd)
+    with kernel_context as kernel_manager:
+        # The kernel is already in cwd, and papermill must not change the
+        # working directory of this process, which may be shared by threads.
+        execute(
+            template_path, output_name, output_dir=output_dir,
+            parameters=parameters, engine_kwargs={**engine_kwargs, 'km': kernel_manager}
+        )
+        peak_rss = kernels.query_peak_rss(kernel_manager)
+    return {
+        'output_name': str(output_name),
+        'queue_wait': None if queued is None else start - queued,
+        'wall_time': time.time() - start,
+        'peak_rss': peak_rss
+    }
+
+
+def execute_caught(*args, **kwargs):
+    """Run execute_measured, returning its result and any error message.
+
+    Errors are returned as messages rather than raised, so that one failed
+    job in a batch doesn't discard the results of the others.
+    """
+    try:
+        return (execute_measured(*args, **kwargs), None)
+    except Exception as e:
+        return (None, '{}: {}'.format(type(e).__name__, e))
+
+
+def template_kernel_name(template_path):
+    """Get the name of the kernel specified by a notebook template."""
+    notebook = nbformat.read(str(template_path), as_version=4)
+    return notebook.metadata.get('kernelspec', {}).get(
+        'name', kernels.DEFAULT_KERNEL_NAME
+    )
+
+
+def pool_size(num_jobs, num_tasks):
+    """Get the number of kernels for a pool, with num_jobs interpreted like joblib."""
+    if num_jobs < 0:
+        num_jobs = max(jl.cpu_count() + 1 + num_jobs, 1)
+    return max(min(num_jobs, num_tasks), 1)
+
+
+def plan_incremental(
+    template_path, output_dir, output_names_parameters, input_locator, manifest
+):
+    """Find the jobs whose outputs are missing or out of date.
+
+    Returns a dict of the parameters of the jobs to run, and a dict of the
+    fingerprints of all jobs, both by output name.
+    """
+    fingerprints = {
+        output_name: manifest.fingerprint(
+            template_path, parameters, input_paths=input_locator(parameters)
+        )
+        for (output_name, parameters) in output_names_parameters.items()
+    }
+    pending = {
+        output_name: parameters
+        for (output_name, parameters) in output_names_parameters.items()
+        if not manifest.is_up_to_date(
+            output_name, fingerprints[output_name],
+            pathlib.Path(output_dir) / output_name
+        )
+    }
+    return (pending, fingerprints)
+
+
+def plan_batch(
+    template_path, output_dir, output_names_parameters, incremental, input_locator,
+    printer
+):
+    """Plan the jobs of a batch for cost-aware scheduling.
+
+    Returns the build manifest of the output directory, the parameters of the
+    jobs to run, and the fingerprints (if incremental), cost features and
+    estimated costs of those jobs, all by output name.
+    """
+    manifest = build_manifest.output_dir_manifest(output_dir)
+    if incremental:
+        (pending, fingerprints) = plan_incremental(
+            template_path, output_dir, output_names_parameters, input_locator,
+            manifest
+        )
+        printer('Skipping {} up-to-date outputs.'.format(
+            len(output_names_parameters) - len(pending)
+        ))
+    else:
+        pending = output_names_parameters
+        fingerprints = {}
+    features = {
+        output_name: scheduling.job_features(parameters, input_locator(parameters))
+        for (output_name, parameters) in pending.items()
+    }
+    cost_model = scheduling.CostModel(manifest)
+    costs = {
+        output_name: cost_model.estimate(output_name, features[output_name])
+        for output_name in pending.keys()
+    }
+    return (manifest, pending, fingerprints, features, costs)
+
+
+def share_input_signals(pending, input_locator):
+    """Publish each data file read by multiple pending jobs in shared memory.
+
+    Returns the files.shared.SharedSignalSets by input path, and the
+    parameters of the pending jobs with a shared_signals parameter (as taken
+    by the plotting template) naming the shared signal set of the data file
+    of each job reading a published file.
+    """
+    paths_output_names = collections.defaultdict(list)
+    for (output_name, parameters) in pending.items():
+        input_paths = input_locator(parameters)
+        if len(input_paths) == 1:
+            paths_output_names[input_paths[0]].append(output_name)
+    shared_signal_sets = {}
+    pending = dict(pending)
+    try:
+        for (input_path, output_names) in paths_output_names.items():
+            if len(output_names) < 2:
+                continue
+            raw_signal_set = signals.RawSignalSet()
+            raw_signal_set.load_csv(input_path)
+            shared_signal_sets[input_path] = shared.SharedSignalSet(raw_signal_set)
+            for output_name in output_names:
+                pending[output_name] = {
+                    **pending[output_name],
+                    'shared_signals': shared_signal_sets[input_path].name
+                }
+    except BaseException:
+        for shared_signal_set in shared_signal_sets.values():
+            shared_signal_set.close()
+        raise
+    return (shared_signal_sets, pending)
 
 
 def batch_serial(
     template_path, output_dir, output_names_cwds, output_names_parameters,
     template_type='template', input_summarizer=lambda parameters: 'inputs',
-    printer=print_md, progress=None, nest_asyncio=True, engine_kwargs={}
+    printer=print_md, progress=None, nest_asyncio=True, incremental=True,
+    input_locator=build_manifest.data_input_paths, engine_kwargs={}
 ):
     """Run a parameterized notebook template each of multiple parameters and outputs.
 
     A progress bar is automatically generated if progress is None. If progress is
-    False, no progress bar is generated or updated.
+    False, no progress bar is generated or updated. If incremental is True,
+    jobs whose template, parameters, input files (found by input_locator) and
+    ventplotting version and source code are unchanged since their output was
+    last saved are skipped.
     """
     printer('Running {} using template `{}`...'.format(template_type, template_path))
-    if progress is None:
-        progress = ipw.IntProgress(
-            min=0, max=len(output_names_parameters), description='Notebooks'
+    if incremental:
+        manifest = build_manifest.output_dir_manifest(output_dir)
+        (pending, fingerprints) = plan_incremental(
+            template_path, output_dir, output_names_parameters, input_locator,
+            manifest
         )
+        printer('Skipping {} up-to-date outputs.'.format(
+            len(output_names_parameters) - len(pending)
+        ))
+    else:
+        pending = output_names_parameters
+    if progress is None:
+        progress = ipw.IntProgress(min=0, max=len(pending), description='Notebooks')
         ipd.display(progress)
     elif progress is False:
         progress = None
@@ -48,18 +242,26 @@ def batch_serial(
         engine_kwargs['nest_asyncio'] = True
 
     try:
-        for (output_name, parameters) in output_names_parameters.items():
+        for (output_name, parameters) in pending.items():
             printer(
                 'Running {} on {} and saving to `{}`...'.format(
                     template_type, input_summarizer(parameters),
                     pathlib.Path(output_dir) / output_name
                 )
             )
-            execute(
+            duration = execute(
                 template_path, output_name, output_dir=output_dir,
                 cwd=output_names_cwds[output_name], parameters=parameters,
                 engine_kwargs=engine_kwargs
             )
+            if incremental:
+                manifest.record(
+                    output_name, fingerprints[output_name], duration,
+                    features=scheduling.job_features(
+                        parameters, input_locator(parameters)
+                    )
+                )
+                manifest.save()
             if progress is not None:
                 progress.value += 1
         if progress is not None:
@@ -73,15 +275,313 @@ def batch_serial(
 def batch_parallel(
     template_path, output_dir, output_names_cwds, output_names_parameters,
     template_type='template', printer=print_md, verbosity=20,
-    num_jobs=-1, method='processes', engine_kwargs={}
+    num_jobs=-1, method='processes', incremental=True,
+    input_locator=build_manifest.data_input_paths, engine_kwargs={},
+    share_inputs=False
 ):
-    """Run a parameterized notebook template on parameters/inputs in parallel."""
+    """Run a parameterized notebook template on parameters/inputs in parallel.
+
+    The method may be 'processes' or 'threads' (as preferred by joblib), or
+    'kernel_pool' to reuse a pool of num_jobs warm kernels across all
+    notebooks, avoiding the startup and import overhead of a new kernel per
+    notebook. If incremental is True, up-to-date outputs are skipped as in
+    batch_serial. If share_inputs is True, each data file read by multiple
+    jobs is loaded once and published in shared memory for the duration of
+    the batch (see share_input_signals), so the template must accept a
+    shared_signals parameter.
+
+    Jobs are dispatched longest-first by their estimated cost (see
+    scheduling.CostModel), so that long jobs don't leave workers idle at the
+    end of the batch. A summary of the wall time, queue wait and peak RSS of
+    each job is saved to batch_summary.json in the output directory. Failed
+    jobs don't stop the other jobs, whose outputs are still recorded, but
+    are raised together at the end as a BatchExecutionError.
+    """
     printer('Running {} using template `{}`...'.format(template_type, template_path))
-    jl.Parallel(n_jobs=num_jobs, prefer=method, verbose=verbosity)(
-        jl.delayed(execute)(
-            template_path, output_name, output_dir=output_dir,
-            cwd=output_names_cwds[output_name], parameters=parameters,
-            engine_kwargs=engine_kwargs
+    (manifest, pending, fingerprints, features, costs) = plan_batch(
+        template_path, output_dir, output_names_parameters, incremental,
+        input_locator, printer
+    )
+    schedule = scheduling.longest_first(costs)
+
+    started = time.time()
+    shared_signal_sets = {}
+    if share_inputs:
+        (shared_signal_sets, pending) = share_input_signals(pending, input_locator)
+    kernel_pool = None
+    try:
+        if method == 'kernel_pool':
+            method = 'threads'  # jobs only wait on pooled kernels
+            if pending:
+                num_jobs = pool_size(num_jobs, len(pending))
+                kernel_pool = kernels.KernelPool(num_jobs).start()
+        results = jl.Parallel(
+            n_jobs=num_jobs, prefer=method, verbose=verbosity, batch_size=1
+        )(
+            jl.delayed(execute_caught)(
+                template_path, output_name, output_dir=output_dir,
+                cwd=output_names_cwds[output_name],
+                parameters=pending[output_name], engine_kwargs=engine_kwargs,
+                kernel_pool=kernel_pool, queued=started
+            )
+            for output_name in schedule
         )
-        for (output_name, parameters) in output_names_parameters.items()
+    finally:
+        if kernel_pool is not None:
+            kernel_pool.shutdown()
+        for shared_signal_set in shared_signal_sets.values():
+            shared_signal_set.close()
+
+    failures = {}
+    summaries = []
+    for (output_name, (result, error)) in zip(schedule, results):
+        if error is not None:
+            failures[output_name] = JobError(output_name, error)
+            summaries.append({'output_name': str(output_name), 'error': error})
+            continue
+        result['estimated_cost'] = costs[output_name]
+        manifest.record(
+            output_name, fingerprints.get(output_name), result['wall_time'],
+            features=features[output_name], peak_rss=result['peak_rss'],
+            queue_wait=result['queue_wait']
+        )
+        summaries.append(result)
+    manifest.save()
+    files.dump_json({
+        'template_path': str(template_path),
+        'started': started,
+        'duration': time.time() - started,
+        'num_skipped': len(output_names_parameters) - len(pending),
+        'jobs': summaries
+    }, path=pathlib.Path(output_dir) / BATCH_SUMMARY_NAME)
+    if failures:
+        raise BatchExecutionError(failures)
+
+
+# ASYNCHRONOUS EXECUTION
+
+class JobError(RuntimeError):
+    """Error raised when a notebook job fails or times out."""
+
+    def __init__(self, output_name, message, stderr='', timed_out=False):
+        """Initialize the error with the job's output name and its papermill stderr."""
+        super().__init__('{}: {}'.format(output_name, message))
+        self.output_name = output_name
+        self.stderr = stderr
+        self.timed_out = timed_out
+
+    @property
+    def kernel_died(self):
+        """Check whether the job failed because its kernel died."""
+        return 'DeadKernelError' in self.stderr
+
+
+class BatchExecutionError(RuntimeError):
+    """Error raised at the end of a batch if any of its jobs failed."""
+
+    def __init__(self, failures):
+        """Initialize the error with a dict of JobErrors by output name."""
+        super().__init__('{} notebook jobs failed:\n{}'.format(
+            len(failures), '\n'.join(str(error) for error in failures.values())
+        ))
+        self.failures = failures
+
+
+def kill_process_tree(process):
+    """Kill a subprocess started in its own session, along with its children."""
+    if process.returncode is not None:
+        return
+    try:
+        if hasattr(os, 'killpg'):
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except ProcessLookupError:
+        pass
+
+
+async def execute_async(
+    template_path, output_name, cwd=None, output_dir=None, parameters={},
+    timeout=None, papermill_args=[]
+):
+    """Run a parameterized notebook template in a papermill subprocess.
+
+    The subprocess and its kernel are killed if the job takes longer than
+    timeout seconds or if the coroutine is cancelled. Returns the duration of
+    the run in seconds, or raises a JobError if it fails or times out.
+    """
+    if output_dir is None:
+        output_dir = ''
+    output_path = pathlib.Path(output_dir) / output_name
+    args = [
+        sys.executable, '-m', 'papermill', str(template_path), str(output_path),
+        '-y', json.dumps(parameters, default=str), '--no-progress-bar',
+        *papermill_args
+    ]
+    if cwd is not None:
+        args += ['--cwd', str(cwd)]
+    start = time.perf_counter()
+    process = await asyncio.create_subprocess_exec(
+        *args, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE,
+        start_new_session=True
     )
+    try:
+        (_, stderr) = await asyncio.wait_for(process.communicate(), timeout)
+    except asyncio.TimeoutError:
+        kill_process_tree(process)
+        await process.wait()
+        raise JobError(
+            output_name, 'timed out after {} s'.format(timeout), timed_out=True
+        )
+    except asyncio.CancelledError:
+        kill_process_tree(process)
+        await process.wait()
+        raise
+    stderr = stderr.decode('utf-8', errors='replace')
+    if process.returncode != 0:
+        lines = stderr.strip().splitlines()
+        raise JobError(output_name, lines[-1] if lines else 'failed', stderr=stderr)
+    return time.perf_counter() - start
+
+
+def in_jupyter():
+    """Check whether the code is running in a Jupyter kernel."""
+    try:
+        import IPython
+    except ImportError:
+        return False
+    shell = IPython.get_ipython()
+    return shell is not None and getattr(shell, 'kernel', None) is not None
+
+
+class BatchProgress(object):
+    """Reporter of progress events from batch_async.
+
+    In Jupyter, progress is shown with an IntProgress bar; otherwise each
+    event is printed as a plain-text line with printer.
+    """
+
+    def __init__(self, total, printer=print, widget=None):
+        """Initialize the reporter for a batch of total jobs.
+
+        If widget is None, a progress bar is displayed when running in Jupyter.
+        """
+        self.total = total
+        self.printer = printer
+        self.completed = 0
+        self.failed = 0
+        if widget is None and in_jupyter():
+            widget = ipw.IntProgress(min=0, max=total, description='Notebooks')
+            ipd.display(widget)
+        self.widget = widget
+
+    def __call__(self, event):
+        """Report an event dict with keys event, output_name and attempt."""
+        if event['event'] in ('finished', 'failed'):
+            self.completed += 1
+        if event['event'] == 'failed':
+            self.failed += 1
+        if self.widget is not None:
+            self.widget.value = self.completed
+            if self.completed == self.total:
+                self.widget.bar_style = 'danger' if self.failed else 'success'
+            return
+        message = '[{}/{}] {} `{}`'.format(
+            self.completed, self.total, event['event'], event['output_name']
+        )
+        if event.get('duration') is not None:
+            message += ' in {:.1f} s'.format(event['duration'])
+        if event.get('error') is not None:
+            message += ': {}'.format(event['error'])
+        self.printer(message)
+
+
+async def batch_async(
+    template_path, output_dir, output_names_cwds, output_names_parameters,
+    template_type='template', printer=print_md, max_concurrency=None,
+    timeout=None, retries=1, incremental=True,
+    input_locator=build_manifest.data_input_paths, on_event=None, papermill_args=[]
+):
+    """Run a parameterized notebook template on parameters/inputs concurrently.
+
+    At most max_concurrency jobs (by default, the number of CPUs) run at once,
+    each in its own papermill subprocess, dispatched longest-first as in
+    batch_parallel. Jobs taking longer than timeout seconds are killed, and
+    jobs whose kernel dies are retried up to retries times. Progress events
+    are passed to on_event (by default, a BatchProgress reporter). Failed
+    jobs don't stop the other jobs, but are raised together at the end as a
+    BatchExecutionError. Returns the durations of the jobs by output name.
+    """
+    printer('Running {} using template `{}`...'.format(template_type, template_path))
+    (manifest, pending, fingerprints, features, costs) = plan_batch(
+        template_path, output_dir, output_names_parameters, incremental,
+        input_locator, printer
+    )
+    if on_event is None:
+        # Progress lines are plain text, as they're only printed outside Jupyter
+        on_event = BatchProgress(len(pending))
+    if max_concurrency is None:
+        max_concurrency = os.cpu_count() or 1
+    semaphore = asyncio.Semaphore(max_concurrency)
+    durations = {}
+    failures = {}
+
+    async def run_job(output_name):
+        async with semaphore:
+            for attempt in range(retries + 1):
+                on_event({
+                    'event': 'started', 'output_name': output_name, 'attempt': attempt
+                })
+                try:
+                    duration = await execute_async(
+                        template_path, output_name, cwd=output_names_cwds[output_name],
+                        output_dir=output_dir, parameters=pending[output_name],
+                        timeout=timeout, papermill_args=papermill_args
+                    )
+                except JobError as e:
+                    if e.kernel_died and attempt < retries:
+                        on_event({
+                            'event': 'retrying', 'output_name': output_name,
+                            'attempt': attempt, 'error': 'kernel died'
+                        })
+                        continue
+                    failures[output_name] = e
+                    on_event({
+                        'event': 'failed', 'output_name': output_name,
+                        'attempt': attempt, 'error': str(e)
+                    })
+                    return
+                durations[output_name] = duration
+                manifest.record(
+                    output_name, fingerprints.get(output_name), duration,
+                    features=features[output_name]
+                )
+                manifest.save()
+                on_event({
+                    'event': 'finished', 'output_name': output_name,
+                    'attempt': attempt, 'duration': duration
+                })
+                return
+
+    # Semaphore waiters are woken in order, so jobs start in schedule order
+    await asyncio.gather(*(
+        run_job(output_name) for output_name in scheduling.longest_first(costs)
+    ))
+    if failures:
+        raise BatchExecutionError(failures)
+    return durations
+
+
+def batch_concurrent(*args, **kwargs):
+    """Run batch_async to completion from synchronous code.
+
+    If an event loop is already running in this thread (as in Jupyter), the
+    batch runs in a separate thread with its own event loop, so nest_asyncio
+    isn't needed. Arguments are passed to batch_async.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(batch_async(*args, **kwargs))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, batch_async(*args, **kwargs)).result()
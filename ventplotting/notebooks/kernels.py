@@ -0,0 +1,210 @@
+"""Pools of warm Jupyter kernels which are reused across notebook executions."""
+import contextlib
+import logging
+import pathlib
+import queue
+
+from jupyter_client.manager import KernelManager
+
+from ventplotting.utilities import paths
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_KERNEL_NAME = 'python3'
+DEFAULT_TIMEOUT = 60  # seconds to wait for kernel startup and for setup code
+# Kernels start in the caller's cwd, so the package may only be importable through
+# the repository path (as notebooks reach it with project_path.add_parent)
+WARMUP_CODE = '\n'.join([
+    'import sys',
+    'if {0!r} not in sys.path: sys.path.insert(0, {0!r})'.format(str(paths.REPO_PATH)),
+    'import numpy',
+    'import pandas',
+    'import matplotlib',
+    'from matplotlib import pyplot',
+    'import ventplotting.analysis',
+    'import ventplotting.plotting.measurements',
+    'import ventplotting.plotting.settings',
+    'import ventplotting.notebooks.display'
+])
+# Clears the user namespace and figures but keeps imported modules loaded
+RESET_CODE = '\n'.join([
+    "get_ipython().run_line_magic('reset', '-f')",
+    'import matplotlib as _matplotlib',
+    'from matplotlib import pyplot as _pyplot',
+    "_pyplot.close('all')",
+    '_matplotlib.rcdefaults()',
+    'import os as _os',
+    '_os.chdir({cwd!r})',
+    'del _matplotlib, _pyplot, _os'
+])
+# Peak resident set size of the kernel process in bytes (ru_maxrss is in KiB on Linux)
+PEAK_RSS_EXPRESSION = (
+    "__import__('resource').getrusage(__import__('resource').RUSAGE_SELF).ru_maxrss"
+    " * (1 if __import__('sys').platform == 'darwin' else 1024)"
+)
+
+
+class KernelError(RuntimeError):
+    """Error raised when setup code fails in a kernel."""
+
+
+# KERNELS
+
+def connect(kernel_manager, timeout=DEFAULT_TIMEOUT):
+    """Make a connected client of a kernel.
+
+    Blocking clients are bound to the thread and event loop which made them,
+    so a new client should be made for each use.
+    """
+    kernel_client = kernel_manager.client()
+    kernel_client.start_channels()
+    kernel_client.wait_for_ready(timeout=timeout)
+    return kernel_client
+
+
+def wait_for_reply(kernel_client, msg_id, timeout=DEFAULT_TIMEOUT):
+    """Wait for the reply to an execute request, raising KernelError if it failed."""
+    while True:
+        reply = kernel_client.get_shell_msg(timeout=timeout)
+        if reply['parent_header'].get('msg_id') == msg_id:
+            break
+    if reply['content']['status'] != 'ok':
+        raise KernelError('Kernel code failed: {}: {}'.format(
+            reply['content'].get('ename'), reply['content'].get('evalue')
+        ))
+    return reply
+
+
+def query_peak_rss(kernel_manager, timeout=DEFAULT_TIMEOUT):
+    """Get the peak resident set size of a kernel process in bytes.
+
+    Returns None if it can't be measured on this platform.
+    """
+    kernel_client = connect(kernel_manager, timeout=timeout)
+    try:
+        msg_id = kernel_client.execute(
+            '', silent=True, user_expressions={'peak_rss': PEAK_RSS_EXPRESSION}
+        )
+        result = wait_for_reply(
+            kernel_client, msg_id, timeout=timeout
+        )['content']['user_expressions']['peak_rss']
+    finally:
+        kernel_client.stop_channels()
+    if result['status'] != 'ok':
+        return None
+    return int(result['data']['text/plain'])
+
+
+@contextlib.contextmanager
+def standalone_kernel(
+        kernel_name=DEFAULT_KERNEL_NAME, cwd=None, timeout=DEFAULT_TIMEOUT
+):
+    """Start a kernel in directory cwd for one notebook execution."""
+    kernel_manager = KernelManager(kernel_name=kernel_name)
+    kernel_manager.start_kernel(cwd=None if cwd is None else str(cwd))
+    try:
+        connect(kernel_manager, timeout=timeout).stop_channels()
+        yield kernel_manager
+    finally:
+        kernel_manager.shutdown_kernel(now=True)
+
+
+# POOLS
+
+class KernelPool(object):
+    """Fixed-size pool of kernels with common imports already loaded.
+
+    Kernels are checked out for one notebook execution at a time with
+    kernel(), which resets the kernel's state before handing it out. Kernels
+    which die during an execution are restarted and warmed up again.
+    """
+
+    def __init__(
+            self, size, kernel_name=DEFAULT_KERNEL_NAME, warmup_code=WARMUP_CODE,
+            timeout=DEFAULT_TIMEOUT
+    ):
+        """Initialize the pool. Kernels are not started until start is called."""
+        self.size = size
+        self.kernel_name = kernel_name
+        self.warmup_code = warmup_code
+        self.timeout = timeout
+        self.kernel_managers = []
+        self._idle = queue.Queue()
+
+    def start(self):
+        """Start and warm up all kernels of the pool concurrently.
+
+        If any kernel fails to start or warm up, all kernels are shut down.
+        """
+        kernel_clients = []
+        try:
+            for _ in range(self.size):
+                kernel_manager = KernelManager(kernel_name=self.kernel_name)
+                self.kernel_managers.append(kernel_manager)
+                kernel_manager.start_kernel()
+            for kernel_manager in self.kernel_managers:
+                kernel_clients.append(connect(kernel_manager, timeout=self.timeout))
+            msg_ids = [
+                kernel_client.execute(self.warmup_code, silent=True)
+                for kernel_client in kernel_clients
+            ]
+            for (kernel_client, msg_id) in zip(kernel_clients, msg_ids):
+                wait_for_reply(kernel_client, msg_id, timeout=self.timeout)
+        except BaseException:
+            self.shutdown()
+            raise
+        finally:
+            for kernel_client in kernel_clients:
+                kernel_client.stop_channels()
+        for i in range(self.size):
+            self._idle.put(i)
+        logger.info('Started %d warm kernels', self.size)
+        return self
+
+    def shutdown(self):
+        """Shut down all kernels of the pool."""
+        for kernel_manager in self.kernel_managers:
+            if kernel_manager.has_kernel:
+                kernel_manager.shutdown_kernel(now=True)
+        self.kernel_managers = []
+        self._idle = queue.Queue()
+
+    def __enter__(self):
+        """Start the pool."""
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Shut down the pool."""
+        self.shutdown()
+
+    def run_code(self, i, code):
+        """Run code silently in the i-th kernel of the pool."""
+        kernel_client = connect(self.kernel_managers[i], timeout=self.timeout)
+        try:
+            wait_for_reply(
+                kernel_client, kernel_client.execute(code, silent=True),
+                timeout=self.timeout
+            )
+        finally:
+            kernel_client.stop_channels()
+
+    @contextlib.contextmanager
+    def kernel(self, cwd=None):
+        """Check out an idle kernel, reset to an empty namespace in directory cwd.
+
+        If cwd is None, the kernel is moved to the current directory.
+        """
+        cwd = pathlib.Path.cwd() if cwd is None else pathlib.Path(cwd).resolve()
+        i = self._idle.get()
+        kernel_manager = self.kernel_managers[i]
+        try:
+            self.run_code(i, RESET_CODE.format(cwd=str(cwd)))
+            yield kernel_manager
+        finally:
+            if not kernel_manager.is_alive():
+                logger.warning('Restarting dead kernel')
+                kernel_manager.restart_kernel(now=True)
+                self.run_code(i, self.warmup_code)
+            self._idle.put(i)
@@ -0,0 +1,158 @@
+"""Build manifests for incremental execution of notebook templates."""
+import hashlib
+import json
+import os
+import pathlib
+import time
+
+import ventplotting
+from ventplotting.datasets import organization
+from ventplotting.utilities import files
+from ventplotting.utilities import paths
+
+
+MANIFEST_NAME = '.ventplotting_manifest.json'
+HASH_BLOCK_BYTES = 1024 ** 2
+
+
+_package_hash = None  # (stats of the package's source files, their combined hash)
+
+
+# FINGERPRINTS
+
+def hash_file(path):
+    """Return the SHA-256 hex digest of the contents of a file."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_BYTES), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def package_hash():
+    """Hash the source files of the ventplotting package.
+
+    The hash is only recomputed when a source file is added, removed or
+    modified, as found from the sizes and modification times of the files.
+    """
+    global _package_hash
+    source_paths = sorted(paths.PACKAGE_PATH.rglob('*.py'))
+    stats = tuple(
+        (str(path), path.stat().st_size, path.stat().st_mtime_ns)
+        for path in source_paths
+    )
+    if _package_hash is None or _package_hash[0] != stats:
+        digest = hashlib.sha256()
+        for path in source_paths:
+            digest.update('{}:{};'.format(
+                path.relative_to(paths.PACKAGE_PATH).as_posix(), hash_file(path)
+            ).encode('utf-8'))
+        _package_hash = (stats, digest.hexdigest())
+    return _package_hash[1]
+
+
+def data_input_paths(parameters):
+    """Get the input data file paths of the parameters of the plotting template.
+
+    Returns an empty list if the parameters don't identify a data file.
+    """
+    try:
+        dataset_path = organization.dataset_path(
+            parameters['dataset_name'], parameters['dataset_collection_name'],
+            collections_dir=parameters['dataset_collections_path']
+        )
+        return [paths.csv_name_to_path(parameters['data_name'], dir=dataset_path)]
+    except KeyError:
+        return []
+
+
+# MANIFESTS
+
+class BuildManifest(object):
+    """Record of the fingerprints and durations of executed notebook jobs.
+
+    A job's fingerprint hashes the template contents, the parameters, the
+    contents of its input files and the ventplotting version and source
+    code. Input file hashes are memoized by path, size and mtime, so
+    unchanged inputs are not re-read on every run.
+    """
+
+    def __init__(self, path):
+        """Load the manifest at the given path, or start an empty one."""
+        self.path = pathlib.Path(path)
+        try:
+            manifest = files.load_json(self.path)
+        except (OSError, ValueError):
+            manifest = {}
+        self.jobs = manifest.get('jobs', {})
+        self.inputs = manifest.get('inputs', {})
+
+    def input_hash(self, path):
+        """Get the content hash of an input file, or None if it doesn't exist."""
+        path = pathlib.Path(path).resolve()
+        try:
+            stat = path.stat()
+        except OSError:
+            return None
+        record = self.inputs.get(str(path))
+        if (
+            record is not None and record['size'] == stat.st_size
+            and record['mtime_ns'] == stat.st_mtime_ns
+        ):
+            return record['sha256']
+        sha256 = hash_file(path)
+        self.inputs[str(path)] = {
+            'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': sha256
+        }
+        return sha256
+
+    def fingerprint(self, template_path, parameters, input_paths=[]):
+        """Compute the fingerprint of a job."""
+        fingerprint_data = {
+            'template': self.input_hash(template_path),
+            'parameters': parameters,
+            'inputs': [self.input_hash(input_path) for input_path in input_paths],
+            'version': ventplotting.__version__,
+            'code': package_hash()
+        }
+        fingerprint_string = json.dumps(fingerprint_data, sort_keys=True, default=str)
+        return hashlib.sha256(fingerprint_string.encode('utf-8')).hexdigest()
+
+    def is_up_to_date(self, output_name, fingerprint, output_path):
+        """Check whether a job's output exists and was made with the same fingerprint."""
+        record = self.jobs.get(str(output_name))
+        return (
+            record is not None and record['fingerprint'] == fingerprint
+            and pathlib.Path(output_path).exists()
+        )
+
+    def record(self, output_name, fingerprint, duration, features=None, **stats):
+        """Record the fingerprint, duration and any other statistics of a completed job.
+
+        Features are the cost features of the job used for scheduling.
+        """
+        self.jobs[str(output_name)] = {
+            'fingerprint': fingerprint, 'duration': duration, 'completed': time.time(),
+            'features': features, **stats
+        }
+
+    def duration(self, output_name):
+        """Get the last recorded duration of a job, or None if it was never run."""
+        record = self.jobs.get(str(output_name))
+        if record is None:
+            return None
+        return record['duration']
+
+    def save(self):
+        """Save the manifest, atomically replacing any previous manifest file."""
+        files.ensure_path(self.path.parent)
+        temp_path = self.path.with_name('{}.tmp-{}'.format(self.path.name, os.getpid()))
+        files.dump_json({'jobs': self.jobs, 'inputs': self.inputs}, path=temp_path)
+        os.replace(temp_path, self.path)
+
+
+def output_dir_manifest(output_dir):
+    """Load the build manifest of an output directory."""
+    if output_dir is None:
+        output_dir = ''
+    return BuildManifest(pathlib.Path(output_dir) / MANIFEST_NAME)
@@ -0,0 +1,91 @@
+"""Cost-aware scheduling of batches of notebook jobs."""
+import os
+
+import numpy as np
+
+
+MIN_FIT_JOBS = 4  # historical jobs needed to fit the linear cost model
+
+
+# COSTS
+
+def job_features(parameters, input_paths):
+    """Get the cost features of a job as a dict.
+
+    The features are the total size of the job's input files in bytes and the
+    duration of its plotting window in seconds, which is None if the window is
+    unbounded.
+    """
+    input_bytes = sum(
+        os.path.getsize(input_path) for input_path in input_paths
+        if os.path.exists(input_path)
+    )
+    (start_time, end_time) = (parameters.get('start_time'), parameters.get('end_time'))
+    window_duration = None
+    if start_time is not None and end_time is not None:
+        window_duration = end_time - start_time
+    return {'input_bytes': input_bytes, 'window_duration': window_duration}
+
+
+def feature_vector(features):
+    """Convert job features to a row of the design matrix of the cost model."""
+    window_duration = features['window_duration']
+    return [
+        1.0, features['input_bytes'],
+        0.0 if window_duration is None else window_duration,
+        1.0 if window_duration is None else 0.0
+    ]
+
+
+class CostModel(object):
+    """Estimator of the run times of jobs in seconds, from a build manifest.
+
+    A job which was run before is estimated by its last recorded run time.
+    Other jobs are estimated from their features by a least-squares linear
+    fit over all recorded jobs, or by the median run time per input byte if
+    too few jobs were recorded for a fit. Without any history, estimates are
+    just input sizes, which is only meaningful for ordering.
+    """
+
+    def __init__(self, manifest):
+        """Fit the model to the jobs recorded in a BuildManifest."""
+        self.manifest = manifest
+        self.coefficients = None
+        self.seconds_per_byte = None
+        self.fit()
+
+    def fit(self):
+        """Fit the model to the history of the manifest."""
+        history = [
+            record for record in self.manifest.jobs.values()
+            if record.get('features') is not None
+        ]
+        if not history:
+            return
+        durations = np.array([record['duration'] for record in history])
+        input_bytes = np.array([record['features']['input_bytes'] for record in history])
+        if np.any(input_bytes > 0):
+            self.seconds_per_byte = float(np.median(
+                durations[input_bytes > 0] / input_bytes[input_bytes > 0]
+            ))
+        if len(history) >= MIN_FIT_JOBS:
+            design = np.array([feature_vector(record['features']) for record in history])
+            (self.coefficients, _, _, _) = np.linalg.lstsq(design, durations, rcond=None)
+
+    def estimate(self, output_name, features):
+        """Estimate the run time of a job."""
+        duration = self.manifest.duration(output_name)
+        if duration is not None:
+            return duration
+        if self.coefficients is not None:
+            return max(float(np.dot(feature_vector(features), self.coefficients)), 0.0)
+        if self.seconds_per_byte is not None:
+            return self.seconds_per_byte * features['input_bytes']
+        return float(features['input_bytes'])
+
+
+# SCHEDULING
+
+def longest_first(costs):
+    """Order job names by decreasing estimated cost."""
+    return sorted(costs.keys(), key=lambda name: costs[name], reverse=True)
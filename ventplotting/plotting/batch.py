@@ -0,0 +1,311 @@
+"""Headless batch rendering of figures for dataset collections."""
+import collections
+import concurrent.futures
+import logging
+import os
+import pathlib
+import time
+
+import matplotlib as mpl
+from matplotlib import pyplot as plt
+
+from ventplotting.analysis import VentAnalyzer
+from ventplotting.datasets import organization
+from ventplotting.files import shared
+from ventplotting.plotting import measurements as mplot
+from ventplotting.plotting import plot
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_FORMATS = ['png', 'pdf', 'svg']
+MAX_SHARED_AHEAD = 2  # data files published in shared memory ahead of rendering
+
+
+# STYLE
+
+def setup_style(backend='Agg'):
+    """Configure matplotlib like the plotting notebook template, for headless use."""
+    mpl.use(backend)
+    plt.style.use('bmh')
+    plot.use_helvetica()
+    mpl.rc('figure', dpi=120, figsize=(8, 6.1))
+    mpl.rc('savefig', dpi=300, transparent=True, bbox='tight')
+
+
+# JOBS
+
+def make_jobs(spec):
+    """Make one rendering job per data file from a collection spec.
+
+    The spec is a dict like the parameters of collection notebooks, with keys
+    dataset_collections_path, dataset_collection_name and data_entries (a dict
+    from dataset names to lists of dicts with data_name, output_name,
+    start_time and end_time). All windows of the same data file are grouped in
+    one job, so each file is only loaded once.
+    """
+    jobs = {}
+    for (dataset_name, entries) in spec['data_entries'].items():
+        for entry in entries:
+            key = (dataset_name, entry['data_name'])
+            if key not in jobs:
+                jobs[key] = {
+                    'dataset_collections_path': spec['dataset_collections_path'],
+                    'dataset_collection_name': spec['dataset_collection_name'],
+                    'dataset_name': dataset_name,
+                    'data_name': entry['data_name'],
+                    'windows': []
+                }
+            jobs[key]['windows'].append({
+                'output_name': entry['output_name'],
+                'start_time': entry.get('start_time'),
+                'end_time': entry.get('end_time')
+            })
+    return list(jobs.values())
+
+
+def transition_output_name(data_name, event):
+    """Name the figure of the window around a setting transition."""
+    return '{}_{}_{:g}-{:g}_{:.0f}s'.format(
+        data_name, event['Setting'], event['Previous'], event['Current'],
+        event['Time']
+    )
+
+
+def make_transition_jobs(
+        collection_name, collections_dir=organization.DATASET_COLLECTIONS_PATH,
+        dataset_names=None, **kwargs_windows
+):
+    """Make one job per data file rendering windows around its setting transitions.
+
+    The windows of each job are only found when it is rendered, after its
+    data file is loaded, so each file only needs one pass. If dataset_names
+    is None, all datasets of the collection are included. Keyword arguments
+    (e.g. before, after, unit and settings) are passed to
+    VentAnalyzer.setting_event_windows.
+    """
+    if dataset_names is None:
+        dataset_names = organization.list_datasets(
+            collection_name, collections_dir=collections_dir
+        )
+    return [
+        {
+            'dataset_collections_path': str(collections_dir),
+            'dataset_collection_name': collection_name,
+            'dataset_name': dataset_name,
+            'data_name': data_name,
+            'windows': [],
+            'transition_windows': kwargs_windows
+        }
+        for dataset_name in dataset_names
+        for data_name in organization.list_data_names(
+            dataset_name, collection_name, collections_dir=collections_dir
+        )
+    ]
+
+
+def job_dataset_path(job):
+    """Get the path of the dataset of a job."""
+    return organization.dataset_path(
+        job['dataset_name'], job['dataset_collection_name'],
+        collections_dir=job['dataset_collections_path']
+    )
+
+
+def job_windows(job, analysis):
+    """Get the windows of a job, including windows around setting transitions."""
+    windows = list(job['windows'])
+    if job.get('transition_windows') is not None:
+        event_windows = analysis.setting_event_windows(**job['transition_windows'])
+        windows.extend(
+            {
+                'output_name': transition_output_name(job['data_name'], event),
+                'start_time': event['StartTime'], 'end_time': event['EndTime']
+            }
+            for (_, event) in event_windows.iterrows()
+        )
+    return windows
+
+
+def render_job(job, output_dir, formats=DEFAULT_FORMATS, kwargs_plot_measurements={}):
+    """Render and save the measurements figure of each window of a job.
+
+    Figures are saved to output_dir / dataset_name / output_name.{format}.
+    All windows are drawn on one reusable MeasurementsFigure.
+    If the job has transition_windows, windows around the setting transitions
+    of the data file are also rendered, as from make_transition_jobs. If the
+    job has shared_signals, the data file is attached from that
+    SharedSignalSet instead of being loaded. Returns a dict with the saved
+    paths and the load and render durations.
+    """
+    start = time.perf_counter()
+    analysis = VentAnalyzer()
+    analysis.load_data(
+        job['data_name'], job_dataset_path(job),
+        shared_signals=job.get('shared_signals')
+    )
+    load_duration = time.perf_counter() - start
+
+    data_title = pathlib.Path(job['dataset_name']) / job['data_name']
+    window_dir = pathlib.Path(output_dir) / job['dataset_name']
+    window_dir.mkdir(parents=True, exist_ok=True)
+    output_paths = []
+    figure = mplot.MeasurementsFigure(
+        fig_maker=mplot.make_fig, kwargs_plot_measurements={
+            'plot_kwargs': {'linewidth': 1.0}, **kwargs_plot_measurements
+        }
+    )
+    with figure:  # one figure for all windows, closed when done
+        for window in job_windows(job, analysis):
+            window_analysis = analysis.window(
+                start_time=window['start_time'], end_time=window['end_time'],
+                realign_time=True
+            )
+            (fig, _, _) = figure.render(window_analysis, data_title)
+            for file_format in formats:
+                output_path = window_dir / '{}.{}'.format(
+                    window['output_name'], file_format
+                )
+                fig.savefig(output_path, dpi=300)
+                output_paths.append(str(output_path))
+    return {
+        'dataset_name': job['dataset_name'], 'data_name': job['data_name'],
+        'output_paths': output_paths, 'load_duration': load_duration,
+        'render_duration': time.perf_counter() - start - load_duration
+    }
+
+
+def split_job(job, windows, shared_signals, num_parts):
+    """Split the windows of a job into contiguous parts rendered from shared signals."""
+    part_size = -(-len(windows) // max(num_parts, 1))  # ceiling division
+    return [
+        {
+            **job, 'windows': windows[i:i + part_size], 'transition_windows': None,
+            'shared_signals': shared_signals.name
+        }
+        for i in range(0, len(windows), max(part_size, 1))
+    ]
+
+
+def merge_results(job, parts, load_duration, start):
+    """Merge the results of the parts of a split job into one result."""
+    return {
+        'dataset_name': job['dataset_name'], 'data_name': job['data_name'],
+        'output_paths': [path for part in parts for path in part['output_paths']],
+        'load_duration': load_duration,
+        'render_duration': time.perf_counter() - start - load_duration
+    }
+
+
+def render_collection(
+        spec, output_dir, formats=DEFAULT_FORMATS, num_workers=None,
+        kwargs_plot_measurements={}, share_signals=False
+):
+    """Render all windows of a collection spec in a pool of worker processes.
+
+    If num_workers is 1, jobs are rendered in the current process instead.
+    Returns the results of render_job for all jobs, in the order of the spec.
+    """
+    return render_jobs(
+        make_jobs(spec), output_dir, formats=formats, num_workers=num_workers,
+        kwargs_plot_measurements=kwargs_plot_measurements,
+        share_signals=share_signals
+    )
+
+
+def render_jobs(
+        jobs, output_dir, formats=DEFAULT_FORMATS, num_workers=None,
+        kwargs_plot_measurements={}, share_signals=False
+):
+    """Render jobs in a pool of worker processes, as for render_collection.
+
+    By default each job is rendered by one worker, which loads its data file.
+    If share_signals is True, each data file is instead loaded once in this
+    process and published as a files.shared.SharedSignalSet, and its windows
+    are split among all workers, which attach to it without copying or
+    re-parsing it; this is faster for few large files with many windows. At
+    most MAX_SHARED_AHEAD files are published at a time.
+    """
+    if num_workers == 1:
+        setup_style()
+        return [
+            render_job(job, output_dir, formats, kwargs_plot_measurements)
+            for job in jobs
+        ]
+
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=num_workers, initializer=setup_style
+    ) as executor:
+        if share_signals:
+            return render_shared_jobs(
+                executor, jobs, output_dir, formats, kwargs_plot_measurements,
+                num_parts=num_workers or os.cpu_count() or 1
+            )
+        futures = [
+            executor.submit(
+                render_job, job, output_dir, formats, kwargs_plot_measurements
+            )
+            for job in jobs
+        ]
+        results = []
+        for future in futures:
+            result = future.result()
+            log_result(result)
+            results.append(result)
+        return results
+
+
+def render_shared_jobs(
+        executor, jobs, output_dir, formats, kwargs_plot_measurements, num_parts
+):
+    """Render the windows of each job split among the workers of an executor.
+
+    Each data file is published in shared memory while its windows are
+    rendered, and is unlinked as soon as they are done or if any fails.
+    """
+    pending = collections.deque()  # (job, shared signals, futures, load, start)
+    results = []
+
+    def finish_oldest():
+        (job, shared_signals, futures, load_duration, start) = pending.popleft()
+        with shared_signals:
+            parts = [future.result() for future in futures]
+        result = merge_results(job, parts, load_duration, start)
+        log_result(result)
+        results.append(result)
+
+    try:
+        for job in jobs:
+            if len(pending) >= MAX_SHARED_AHEAD:
+                finish_oldest()
+            start = time.perf_counter()
+            analysis = VentAnalyzer()
+            analysis.load_data(job['data_name'], job_dataset_path(job))
+            windows = job_windows(job, analysis)
+            shared_signals = shared.SharedSignalSet(analysis.raw_signals)
+            del analysis  # only the shared copy of the signals is kept
+            load_duration = time.perf_counter() - start
+            futures = [
+                executor.submit(
+                    render_job, part, output_dir, formats, kwargs_plot_measurements
+                )
+                for part in split_job(job, windows, shared_signals, num_parts)
+            ]
+            pending.append((job, shared_signals, futures, load_duration, start))
+        while pending:
+            finish_oldest()
+    finally:
+        for (_, shared_signals, futures, _, _) in pending:
+            for future in futures:
+                future.cancel()
+            shared_signals.close()
+    return results
+
+
+def log_result(result):
+    """Log the number of files rendered for a job."""
+    logger.info(
+        'Rendered %d files for %s/%s', len(result['output_paths']),
+        result['dataset_name'], result['data_name']
+    )
@@ -0,0 +1,76 @@
+"""Peak-preserving decimation of timeseries for plotting."""
+import numpy as np
+
+
+POINTS_PER_PIXEL = 2  # a min and a max for each pixel column
+
+
+def minmax_indices(values, num_points):
+    """Get sorted indices of the min and max values in each of num_points / 2 buckets.
+
+    Values are split into buckets of equal numbers of samples; all indices are
+    returned if there are no more than num_points values.
+    """
+    num_values = len(values)
+    if num_values <= num_points:
+        return np.arange(num_values)
+    num_buckets = max(num_points // 2, 1)
+    bucket_size = -(-num_values // num_buckets)  # ceiling division
+    num_full_buckets = num_values // bucket_size
+    full_size = num_full_buckets * bucket_size
+    buckets = values[:full_size].reshape(num_full_buckets, bucket_size)
+    bucket_starts = np.arange(num_full_buckets) * bucket_size
+    mins = bucket_starts + np.argmin(buckets, axis=1)
+    maxs = bucket_starts + np.argmax(buckets, axis=1)
+    if full_size < num_values:  # partial last bucket
+        remainder = values[full_size:]
+        mins = np.append(mins, full_size + np.argmin(remainder))
+        maxs = np.append(maxs, full_size + np.argmax(remainder))
+    # Order each bucket's min and max in time, then drop repeats of flat buckets
+    indices = np.ravel(np.column_stack((np.minimum(mins, maxs), np.maximum(mins, maxs))))
+    return indices[np.append(True, indices[1:] != indices[:-1])]
+
+
+def minmax_decimate(times, values, num_points):
+    """Decimate a timeseries to about num_points points, keeping bucket extremes.
+
+    Peaks and troughs are kept exactly, so the decimated line covers the same
+    vertical extent as the full line at every pixel column.
+    """
+    values = np.asarray(values)
+    indices = minmax_indices(values, num_points)
+    return (np.asarray(times)[indices], values[indices])
+
+
+def axes_num_points(ax, points_per_pixel=POINTS_PER_PIXEL):
+    """Get the number of points needed to draw a line across the width of an axis."""
+    width = ax.get_window_extent().width  # in pixels at the figure's dpi
+    return max(int(np.ceil(width * points_per_pixel)), 2)
+
+
+def series_for_axes(
+        raw_signal_set, column_name, ax, start_time=None, end_time=None,
+        decimate=False, pyramid=None
+):
+    """Get (times, values) arrays of a signal between two times for plotting on an axis.
+
+    If pyramid is given, the values are queried from that SignalPyramid;
+    otherwise, if decimate is True or an int, the raw samples are decimated.
+    A decimate of True gives enough points to draw across the axis, while an
+    int gives about that many points.
+    """
+    if decimate is True or (decimate is False and pyramid is not None):
+        num_points = axes_num_points(ax)
+    else:
+        num_points = decimate
+    if pyramid is not None:
+        return pyramid.query(
+            column_name, start_time=start_time, end_time=end_time,
+            max_points=num_points, raw_signal_set=raw_signal_set
+        )
+    arrays = raw_signal_set.slice_arrays(
+        start_time=start_time, end_time=end_time, column_names=['Time', column_name]
+    )
+    if decimate is False:
+        return (arrays['Time'], arrays[column_name])
+    return minmax_decimate(arrays['Time'], arrays[column_name], num_points)
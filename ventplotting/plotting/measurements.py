@@ -1,6 +1,11 @@
 """Functionality for plotting of raw measurements."""
+import pandas as pd
+
+from ventplotting.plotting import decimation
 from ventplotting.plotting import plot
-from ventplotting.utilities import timeseries
+
+
+MEASUREMENT_COLORS = {'Paw': '#8da0cb', 'Flow': '#66c2a5', 'Volume': '#fc8d62'}
 
 
 def make_fig(num_rows=3, **kwargs):
@@ -15,6 +20,41 @@ def make_fig_with_legends(num_rows=3, **kwargs):
     return plot.make_fig_with_legends(**kwargs)
 
 
+def measurement_series(
+    raw_signal_set, ax_pressure, ax_flow, ax_volume,
+    start_time=None, end_time=None, realign_time=False, decimate=False, pyramid=None
+):
+    """Get the (times, values) arrays of each measurement to plot on its axis.
+
+    Returns a dict by column name. Times are relative to the plotted time
+    offset, and values are decimated as described for plot_measurements.
+    """
+    time_offset = raw_signal_set.time_offset
+    if realign_time:
+        (start, end) = raw_signal_set.interval_bounds(
+            start_time=start_time, end_time=end_time
+        )
+        if start < end:
+            time_offset = raw_signal_set.time_array[start]
+
+    series = {}
+    for (column_name, ax) in [
+        ('Paw', ax_pressure), ('Flow', ax_flow), ('Volume', ax_volume)
+    ]:
+        (times, values) = decimation.series_for_axes(
+            raw_signal_set, column_name, ax, start_time=start_time,
+            end_time=end_time, decimate=decimate, pyramid=pyramid
+        )
+        series[column_name] = (times - time_offset, values)
+    return series
+
+
+def symmetric_flow_max(raw_signal_set):
+    """Get the largest flow magnitude, for symmetric flow axis limits."""
+    df = raw_signal_set.df
+    return max(abs(df.Flow.min()), abs(df.Flow.max()))
+
+
 def plot_measurements(
     raw_signal_set, ax_pressure, ax_flow, ax_volume,
     start_time=None, end_time=None, realign_time=False,
@@ -24,38 +64,74 @@ def plot_measurements(
     flow_major_spacing=60, flow_minor_spacing=30,
     volume_min=0, volume_max=550,
     volume_major_spacing=200, volume_minor_spacing=100,
-    plot_kwargs={}
+    decimate=False, pyramid=None, plot_kwargs={}
 ):
     """Plot all measurements from a RawSignalSet.
 
     Plot each measurement on its own axis.
+    If decimate is True, each measurement is reduced to the min and max
+    samples in each pixel column of its axis before plotting; if decimate is
+    an int, each measurement is reduced to about that many points instead.
+    If a SignalPyramid of the RawSignalSet is given, measurements are drawn
+    from its summaries rather than from the raw samples. Times are plotted
+    relative to the time_offset of the RawSignalSet (e.g. of a realigned
+    SignalWindow), or to the start of the interval if realign_time is True.
+    Returns the line and the filled collection of each measurement, by
+    column name.
     """
-    sliced = timeseries.slice_interval(
-        raw_signal_set.df, start_time=start_time, end_time=end_time
+    series = measurement_series(
+        raw_signal_set, ax_pressure, ax_flow, ax_volume,
+        start_time=start_time, end_time=end_time, realign_time=realign_time,
+        decimate=decimate, pyramid=pyramid
     )
+    artists = {}
+    for (column_name, ax) in [
+        ('Paw', ax_pressure), ('Flow', ax_flow), ('Volume', ax_volume)
+    ]:
+        color = MEASUREMENT_COLORS[column_name]
+        (times, values) = series[column_name]
+        measurement = pd.DataFrame({'Time': times, column_name: values})
+        measurement.plot(
+            x='Time', y=column_name, ax=ax, legend=False, color=color, **plot_kwargs
+        )
+        fill = plot.fill_timeseries(
+            measurement.Time, measurement[column_name], ax, color=color
+        )
+        artists[column_name] = (ax.get_lines()[-1], fill)
 
-    if realign_time:
-        sliced = sliced.copy()
-        sliced.Time = sliced.Time - sliced.Time.min()
+    if flow_min is None or flow_max is None:  # make flow limits symmetric
+        flow_max = symmetric_flow_max(raw_signal_set)
+        flow_min = -flow_max
+    set_measurement_axes(
+        ax_pressure, ax_flow, ax_volume,
+        pressure_min=pressure_min, pressure_max=pressure_max,
+        pressure_major_spacing=pressure_major_spacing,
+        pressure_minor_spacing=pressure_minor_spacing,
+        flow_min=flow_min, flow_max=flow_max,
+        flow_major_spacing=flow_major_spacing, flow_minor_spacing=flow_minor_spacing,
+        volume_min=volume_min, volume_max=volume_max,
+        volume_major_spacing=volume_major_spacing,
+        volume_minor_spacing=volume_minor_spacing
+    )
+    return artists
 
-    sliced.plot(x='Time', y='Paw', ax=ax_pressure, legend=False, color='#8da0cb', **plot_kwargs)
-    plot.fill_timeseries(sliced.Time, sliced.Paw, ax_pressure, color='#8da0cb')
-    sliced.plot(x='Time', y='Flow', ax=ax_flow, legend=False, color='#66c2a5', **plot_kwargs)
-    plot.fill_timeseries(sliced.Time, sliced.Flow, ax_flow, color='#66c2a5')
-    sliced.plot(x='Time', y='Volume', ax=ax_volume, legend=False, color='#fc8d62', **plot_kwargs)
-    plot.fill_timeseries(sliced.Time, sliced.Volume, ax_volume, color='#fc8d62')
 
+def set_measurement_axes(
+    ax_pressure, ax_flow, ax_volume,
+    pressure_min=0, pressure_max=45,
+    pressure_major_spacing=20, pressure_minor_spacing=10,
+    flow_min=-80, flow_max=80,
+    flow_major_spacing=60, flow_minor_spacing=30,
+    volume_min=0, volume_max=550,
+    volume_major_spacing=200, volume_minor_spacing=100
+):
+    """Set the labels, limits and ticks of the y axes of measurement plots."""
     plot.set_y_axis_label(ax_pressure, 'Pressure', units='cmH2O')
     plot.set_y_axis_label(ax_flow, 'Flow', units='L/min')
     plot.set_y_axis_label(ax_volume, 'Volume', units='mL')
 
     plot.limit_y_axes([ax_pressure], min=pressure_min, max=pressure_max)
-    if flow_min is not None and flow_max is not None:
-        plot.limit_y_axes([ax_flow], min=flow_min, max=flow_max)
-    else:  # make flow limits symmetric
-        df = raw_signal_set.df
-        flow_y_lim = max(abs(df.Flow.min()), abs(df.Flow.max()))
-        plot.limit_y_axes([ax_flow], min=-flow_y_lim, max=flow_y_lim)
+    plot.limit_y_axes([ax_flow], min=flow_min, max=flow_max)
     plot.limit_y_axes([ax_volume], min=volume_min, max=volume_max)
 
     plot.set_y_axis(
@@ -92,3 +168,62 @@ def make_measurements_fig(
     plot_measurements(analysis.raw_signals, *plot_axes, **kwargs_plot_measurements)
     plot.polish_axes(plot_axes, legend_axes, **kwargs_polish_axes)
     return (fig, plot_axes, legend_axes)
+
+
+class MeasurementsFigure(plot.FigureTemplate):
+    """Reusable figure of measurements, as from make_measurements_fig.
+
+    Each render after the first only swaps the data of the measurement
+    lines and fills (and the symmetric flow limits, if requested), keeping
+    the axes, tickers and labels of the first render. Axis limits, tick
+    spacings and plot_kwargs are thus fixed by the first render, while the
+    time interval, realignment and decimation apply to every render.
+    """
+
+    def __init__(
+            self, column_title='Raw Measurements', fig_maker=make_fig_with_legends,
+            kwargs_make_fig={'num_cols': 1}, kwargs_plot_measurements={},
+            kwargs_polish_axes={
+                'kwargs_set_x_axes': {'kwargs_grid': {'alpha': 0.5}},
+                'kwargs_set_y_axes': {'kwargs_grid': {'alpha': 0.5}}
+            }
+    ):
+        """Set up the template with the arguments of make_measurements_fig."""
+        super().__init__()
+        self.column_title = column_title
+        self.fig_maker = fig_maker
+        self.kwargs_make_fig = {**kwargs_make_fig, 'num_cols': 1}
+        self.kwargs_plot_measurements = kwargs_plot_measurements
+        self.kwargs_polish_axes = kwargs_polish_axes
+        self.artists = None  # (line, fill) of each measurement, by column name
+
+    def draw(self, analysis, fig_title):
+        """Make the figure as make_measurements_fig does, keeping its artists."""
+        (fig, plot_axes, legend_axes) = self.fig_maker(**self.kwargs_make_fig)
+        if self.fig_maker == make_fig_with_legends:
+            self.title = plot.add_fig_title(fig, fig_title)
+            plot.add_axes_title(plot_axes, self.column_title)
+        self.artists = plot_measurements(
+            analysis.raw_signals, *plot_axes, **self.kwargs_plot_measurements
+        )
+        plot.polish_axes(plot_axes, legend_axes, **self.kwargs_polish_axes)
+        return (fig, plot_axes, legend_axes)
+
+    def update(self, analysis):
+        """Replace the measurements drawn with those of another analysis."""
+        kwargs = self.kwargs_plot_measurements
+        series = measurement_series(
+            analysis.raw_signals, *self.plot_axes, **{
+                name: kwargs[name] for name in [
+                    'start_time', 'end_time', 'realign_time', 'decimate', 'pyramid'
+                ] if name in kwargs
+            }
+        )
+        for (column_name, (line, fill)) in self.artists.items():
+            (times, values) = series[column_name]
+            line.set_data(times, values)
+            plot.set_fill_data(fill, times, values)
+        if any(kwargs.get(name, 0) is None for name in ['flow_min', 'flow_max']):
+            flow_max = symmetric_flow_max(analysis.raw_signals)
+            plot.limit_y_axes([self.plot_axes[1]], min=-flow_max, max=flow_max)
+        plot.rescale_x_axes(self.plot_axes)
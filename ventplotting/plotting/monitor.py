@@ -0,0 +1,266 @@
+"""Real-time display of live measurements."""
+import time
+
+from matplotlib import animation
+from matplotlib import pyplot as plt
+
+import numpy as np
+
+from ventplotting.plotting import decimation
+from ventplotting.plotting import measurements as mplot
+from ventplotting.plotting import plot
+
+
+DEFAULT_FPS = 25
+DEFAULT_MAX_POINTS = 2000  # points drawn per line in each frame
+SWEEP_GAP_FRACTION = 0.02  # fraction of the window blanked ahead of the sweep cursor
+
+
+# STATISTICS
+
+class FrameStats(object):
+    """Counters of monitor frame rendering."""
+
+    def __init__(self):
+        """Initialize all counters to zero."""
+        self.frames_rendered = 0
+        self.frames_dropped = 0
+        self.render_time = 0.0  # total seconds spent rendering frames
+        self.last_render_time = 0.0
+
+    @property
+    def mean_render_time(self):
+        """Get the mean time in seconds to render a frame."""
+        if self.frames_rendered == 0:
+            return 0.0
+        return self.render_time / self.frames_rendered
+
+    def as_dict(self):
+        """Return the counters as a dict."""
+        return {
+            'frames_rendered': self.frames_rendered,
+            'frames_dropped': self.frames_dropped,
+            'render_time': self.render_time,
+            'last_render_time': self.last_render_time,
+            'mean_render_time': self.mean_render_time
+        }
+
+    def __repr__(self):
+        """Represent the counters."""
+        return 'FrameStats({})'.format(
+            ', '.join('{}={}'.format(*item) for item in self.as_dict().items())
+        )
+
+
+# WINDOWS
+
+def scroll_window(times, values, latest_time):
+    """Get the (x, y) points of a window scrolling with the latest time.
+
+    x is the time relative to the latest time, so the latest sample is at 0.
+    """
+    return (times - latest_time, values)
+
+
+def sweep_window(
+        times, values, latest_time, window_duration,
+        gap_fraction=SWEEP_GAP_FRACTION
+):
+    """Get the (x, y) points of a window swept from left to right like a monitor.
+
+    x is the time modulo window_duration, so new samples overwrite the
+    previous sweep from the left. Samples of the previous sweep just ahead of
+    the cursor are hidden, and a NaN breaks the line at the cursor.
+    """
+    x = np.mod(times, window_duration)
+    cursor = latest_time % window_duration
+    sweep_start = latest_time - cursor
+    previous = times < sweep_start
+    visible = ~previous | (x > cursor + gap_fraction * window_duration)
+    x = x[visible]
+    values = values[visible].astype('float64')
+    num_current = int(np.count_nonzero(~previous[visible]))
+    num_previous = len(x) - num_current
+    # Put the previous sweep's tail after the current sweep, separated by a NaN
+    x = np.concatenate((x[num_previous:], [np.nan], x[:num_previous]))
+    values = np.concatenate((values[num_previous:], [np.nan], values[:num_previous]))
+    return (x, values)
+
+
+# MONITORS
+
+class WaveformMonitor(object):
+    """Live display of pressure, flow and volume with blitted line updates.
+
+    Lines are created once and updated with Line2D.set_data each frame, and
+    only the lines are redrawn over a cached background of the axes, so
+    frames are cheap enough for 20-30 fps. The signal set is polled each frame
+    if it has a poll method (as a LiveSignalSet does). In 'scroll' mode the
+    time axis shows the last window_duration seconds relative to the latest
+    sample; in 'sweep' mode a cursor sweeps left to right across a fixed
+    window, overwriting the previous sweep. Areas under the lines are not
+    filled, unlike plot_measurements.
+    """
+
+    def __init__(
+            self, signal_set, window_duration=10, mode='scroll',
+            max_points=DEFAULT_MAX_POINTS, axes=None, kwargs_make_fig={},
+            kwargs_set_measurement_axes={}, plot_kwargs={'linewidth': 1.0}
+    ):
+        """Set up the figure, axes and line artists of the monitor.
+
+        If axes is None, a new figure with three stacked axes is made.
+        """
+        if mode not in ('scroll', 'sweep'):
+            raise ValueError('Unknown monitor mode {}!'.format(mode))
+        self.signal_set = signal_set
+        self.window_duration = window_duration
+        self.mode = mode
+        self.max_points = max_points
+        if axes is None:
+            (_, axes, _) = mplot.make_fig(**kwargs_make_fig)
+        self.axes = list(axes)
+        self.fig = self.axes[0].figure
+        self.stats = FrameStats()
+
+        mplot.set_measurement_axes(*self.axes, **kwargs_set_measurement_axes)
+        plot.set_x_axes(self.axes, kwargs_grid={'alpha': 0.5})
+        plot.set_y_axes(self.axes, kwargs_grid={'alpha': 0.5})
+        if mode == 'scroll':
+            plot.limit_x_axes(self.axes, min=-window_duration, max=0)
+        else:
+            plot.limit_x_axes(self.axes, min=0, max=window_duration)
+        self.lines = {}
+        for (column_name, ax) in zip(['Paw', 'Flow', 'Volume'], self.axes):
+            (self.lines[column_name],) = ax.plot(
+                [], [], color=mplot.MEASUREMENT_COLORS[column_name], animated=True,
+                **plot_kwargs
+            )
+        self.cursors = []
+        if mode == 'sweep':
+            self.cursors = [
+                ax.axvline(0, color='gray', linewidth=0.5, animated=True)
+                for ax in self.axes
+            ]
+
+        self.background = None
+        self._last_frame = None
+        self.fig.canvas.mpl_connect('draw_event', self._on_draw)
+
+    @property
+    def artists(self):
+        """Get the animated artists of the monitor."""
+        return list(self.lines.values()) + self.cursors
+
+    def _on_draw(self, event):
+        # The background must be recaptured whenever the whole figure is redrawn
+        self.background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+        self._draw_artists()
+
+    def _draw_artists(self):
+        for artist in self.artists:
+            artist.axes.draw_artist(artist)
+
+    # Frames
+
+    def update_data(self):
+        """Poll the signal set and update the data of the line artists.
+
+        Returns the animated artists.
+        """
+        if hasattr(self.signal_set, 'poll'):
+            self.signal_set.poll()
+        arrays = self.signal_set.arrays
+        if not arrays or not len(arrays['Time']):
+            return self.artists
+        times = arrays['Time']
+        latest_time = times[-1]
+        (start, end) = self.signal_set.interval_bounds(
+            start_time=latest_time - self.window_duration
+        )
+        times = times[start:end]
+        for (column_name, line) in self.lines.items():
+            values = arrays[column_name][start:end]
+            (window_times, window_values) = decimation.minmax_decimate(
+                times, values, self.max_points
+            )
+            if self.mode == 'scroll':
+                (x, y) = scroll_window(window_times, window_values, latest_time)
+            else:
+                (x, y) = sweep_window(
+                    window_times, window_values, latest_time, self.window_duration
+                )
+            line.set_data(x, y)
+        for cursor in self.cursors:
+            cursor.set_xdata([latest_time % self.window_duration] * 2)
+        return self.artists
+
+    def render(self, fps=None):
+        """Render a frame by blitting the updated artists onto the background.
+
+        If fps is given, frames which should have been rendered since the
+        previous frame at that rate are counted as dropped.
+        """
+        start = self._start_frame(fps)
+        canvas = self.fig.canvas
+        if self.background is None:
+            canvas.draw()  # captures the background through _on_draw
+        self.update_data()
+        canvas.restore_region(self.background)
+        self._draw_artists()
+        canvas.blit(self.fig.bbox)
+        canvas.flush_events()
+        self._finish_frame(start)
+
+    def _start_frame(self, fps):
+        start = time.perf_counter()
+        if fps is not None and self._last_frame is not None:
+            missed = int((start - self._last_frame) * fps) - 1
+            self.stats.frames_dropped += max(missed, 0)
+        self._last_frame = start
+        return start
+
+    def _finish_frame(self, start):
+        render_time = time.perf_counter() - start
+        self.stats.frames_rendered += 1
+        self.stats.render_time += render_time
+        self.stats.last_render_time = render_time
+
+    def run(self, fps=DEFAULT_FPS, duration=None):
+        """Render frames at up to fps in a loop, for duration seconds or forever.
+
+        This is meant for a standalone window (e.g. with the TkAgg backend)
+        or for headless benchmarking with Agg. The loop stops early if an
+        interactive window is closed.
+        """
+        period = 1 / fps
+        # Only figures managed by pyplot have a number to check for closing
+        manager = self.fig.canvas.manager
+        if self.fig.canvas.required_interactive_framework is not None:
+            plt.show(block=False)
+        start = time.perf_counter()
+        while duration is None or time.perf_counter() - start < duration:
+            frame_start = time.perf_counter()
+            self.render(fps=fps)
+            if manager is not None and not plt.fignum_exists(manager.num):
+                break  # the window was closed
+            remaining = period - (time.perf_counter() - frame_start)
+            if remaining > 0:
+                time.sleep(remaining)
+
+    def animate(self, fps=DEFAULT_FPS):
+        """Make a blitted FuncAnimation of the monitor, for notebooks and GUI backends.
+
+        The animation must be kept referenced for as long as it should run.
+        In notebooks, use an interactive backend such as ipympl.
+        """
+        def update(frame):
+            start = self._start_frame(fps)
+            artists = self.update_data()
+            self._finish_frame(start)
+            return artists
+
+        return animation.FuncAnimation(
+            self.fig, update, interval=1000 / fps, blit=True,
+            cache_frame_data=False
+        )
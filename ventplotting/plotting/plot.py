@@ -2,6 +2,7 @@
 import itertools
 
 import matplotlib as mpl
+from matplotlib import cbook
 from matplotlib import pyplot as plt
 from matplotlib import ticker
 
@@ -42,8 +43,8 @@ def add_axes_title(axes, title):
 
 
 def add_fig_title(fig, title, left_padding=0.05, top_padding=0):
-    """Add a left-aligned figure title."""
-    fig.suptitle(
+    """Add a left-aligned figure title, returning its text artist."""
+    return fig.suptitle(
         title, x=left_padding, y=1 + top_padding, horizontalalignment='left'
     )
 
@@ -56,8 +57,11 @@ def plot_timeseries(
         ylabel=None, units=None, **kwargs
 ):
     """Plot a timeseries."""
-    times = timeseries.slice_interval(times, start_time=start_time, end_time=end_time)
-    series = timeseries.slice_interval(series, start_time=start_time, end_time=end_time)
+    (start, end) = timeseries.time_index_bounds(
+        times.index, start_time=start_time, end_time=end_time
+    )
+    times = times.iloc[start:end]
+    series = series.iloc[start:end]
     ax.plot(
         times, series, label=legend_label_template.format(*legend_label_components),
         **kwargs
@@ -67,8 +71,36 @@ def plot_timeseries(
 
 
 def fill_timeseries(times, series, ax, **kwargs):
-    """Fill the area under a timeseries."""
-    ax.fill_between(times, series, series * 0, **kwargs)
+    """Fill the area under a timeseries, returning the filled collection."""
+    return ax.fill_between(times, series, series * 0, **kwargs)
+
+
+def fill_vertices(times, series, step=None):
+    """Get the vertices of the area filled by fill_timeseries, as fill_between does."""
+    times = np.asarray(times, dtype='float64')
+    values = np.asarray(series, dtype='float64')
+    zeros = values * 0
+    if step == 'post':
+        (times, values, zeros) = cbook.pts_to_poststep(times, values, zeros)
+    if not len(times):
+        return np.zeros((0, 2))
+    return np.concatenate([
+        [(times[0], zeros[0])], np.column_stack((times, values)),
+        [(times[-1], zeros[-1])], np.column_stack((times, zeros))[::-1]
+    ])
+
+
+def set_fill_data(collection, times, series, step=None):
+    """Replace the area filled by fill_timeseries with that under another timeseries.
+
+    The step must be the same as when the area was filled.
+    """
+    if hasattr(collection, 'set_data'):  # FillBetweenPolyCollection, matplotlib 3.10+
+        # Also updates its data limits, which are cached from its data
+        series = np.asarray(series)
+        collection.set_data(times, series, series * 0)
+        return
+    collection.set_verts([fill_vertices(times, series, step=step)])
 
 
 # LEGENDS
@@ -204,6 +236,13 @@ def set_y_axes(plot_axes, grid='both', kwargs_grid={}):
         ax.yaxis.grid(True, which=grid, **kwargs_grid)
 
 
+def rescale_x_axes(plot_axes):
+    """Autoscale the time axes to the current data of their lines."""
+    for ax in plot_axes:
+        ax.relim()
+        ax.autoscale_view()
+
+
 def limit_y_axes(plot_axes, min=None, max=None):
     """Limit the y axes to the specified range."""
     for ax in plot_axes:
@@ -230,6 +269,63 @@ def polish_axes(
     add_legends(plot_axes, legend_axes, **kwargs_add_legends)
 
 
+# TEMPLATES
+
+class FigureTemplate(object):
+    """Figure made once and then redrawn for other data by swapping artist data.
+
+    When many figures with the same layout are rendered (e.g. for windows of
+    a recording), the axes, tickers, labels and legends made by the first
+    render are kept, and later renders only replace the data of its lines
+    and fills. Subclasses implement draw, which makes the figure, and
+    update, which replaces its data. The figure is closed by close (or on
+    exiting a with block), so pyplot doesn't keep it alive.
+    """
+
+    def __init__(self):
+        """Make a template with no figure yet."""
+        self.fig = None
+        self.plot_axes = None
+        self.legend_axes = None
+        self.title = None  # text artist of the figure title, if any
+
+    def render(self, analysis, fig_title):
+        """Draw the figure for an analysis, reusing the figure of earlier renders.
+
+        Returns the figure, its plot axes and its legend axes.
+        """
+        if self.fig is None:
+            (self.fig, self.plot_axes, self.legend_axes) = self.draw(analysis, fig_title)
+        else:
+            if self.title is not None:
+                self.title.set_text(fig_title)
+            self.update(analysis)
+        return (self.fig, self.plot_axes, self.legend_axes)
+
+    def draw(self, analysis, fig_title):
+        """Make the figure for an analysis, returning it with its plot and legend axes."""
+        raise NotImplementedError
+
+    def update(self, analysis):
+        """Replace the data drawn on the figure with that of another analysis."""
+        raise NotImplementedError
+
+    def close(self):
+        """Close the figure, releasing it from pyplot."""
+        if self.fig is not None:
+            plt.close(self.fig)
+        self.fig = None
+        self.title = None
+
+    def __enter__(self):
+        """Enter a context which closes the figure on exit."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Close the figure."""
+        self.close()
+
+
 # STYLING
 
 def use_helvetica():
@@ -1,6 +1,5 @@
 """Functionality for plotting of settings."""
 from ventplotting.plotting import plot
-from ventplotting.utilities import timeseries
 
 
 def make_fig(num_rows=3, **kwargs):
@@ -15,23 +14,41 @@ def make_fig_with_legends(num_rows=3, **kwargs):
     return plot.make_fig_with_legends(**kwargs)
 
 
+def settings_series(raw_signal_set, start_time=None, end_time=None):
+    """Get the (times, values) step points of each setting plotted by plot_settings.
+
+    Returns a dict by column name, with times relative to the time_offset
+    of the RawSignalSet.
+    """
+    settings_runs = raw_signal_set.settings_runs
+    series = {}
+    for column_name in ['Vt', 'Ti', 'RR']:
+        (times, values) = settings_runs[column_name].step_points(
+            start_time=start_time, end_time=end_time
+        )
+        series[column_name] = (times - raw_signal_set.time_offset, values)
+    return series
+
+
 def plot_settings(
-        raw_signal_set, ax_volume, ax_time, ax_rate,
-        start_time=None, end_time=None
+        raw_signal_set, ax_volume, ax_time, ax_rate, start_time=None, end_time=None
 ):
     """Plot all control settings from a RawSignalSet.
 
-    Plot each setting on its own axis.
+    Plot each setting on its own axis, as steps between the change points of
+    its run-length encoding, so the number of points drawn only depends on
+    the number of setting changes (and long intervals need no decimation).
+    Times are plotted relative to the time_offset of the RawSignalSet.
+    Returns the line and the filled collection of each setting, by column
+    name.
     """
-    sliced = timeseries.slice_interval(
-        raw_signal_set.df, start_time=start_time, end_time=end_time
-    )
-    sliced.plot(x='Time', y='Vt', ax=ax_volume, legend=False)
-    plot.fill_timeseries(sliced.Time, sliced.Vt, ax_volume)
-    sliced.plot(x='Time', y='Ti', ax=ax_time, legend=False)
-    plot.fill_timeseries(sliced.Time, sliced.Ti, ax_time)
-    sliced.plot(x='Time', y='RR', ax=ax_rate, legend=False)
-    plot.fill_timeseries(sliced.Time, sliced.RR, ax_rate)
+    series = settings_series(raw_signal_set, start_time=start_time, end_time=end_time)
+    artists = {}
+    for (column_name, ax) in [('Vt', ax_volume), ('Ti', ax_time), ('RR', ax_rate)]:
+        (times, values) = series[column_name]
+        (line,) = ax.step(times, values, where='post')
+        fill = plot.fill_timeseries(times, values, ax, step='post')
+        artists[column_name] = (line, fill)
 
     plot.set_y_axis_label(ax_volume, 'Volume', units='mL')
     plot.limit_y_axes([ax_volume], min=0, max=500)
@@ -39,6 +56,7 @@ def plot_settings(
     plot.limit_y_axes([ax_time], min=0, max=1.5)
     plot.set_y_axis_label(ax_rate, 'Rate', units='/min')
     plot.limit_y_axes([ax_rate], min=0, max=35)
+    return artists
 
 
 # STANDARD FIGURES
@@ -57,3 +75,48 @@ def make_settings_fig(
     plot_settings(analysis.raw_signals, *plot_axes, **kwargs_plot_settings)
     plot.polish_axes(plot_axes, legend_axes, **kwargs_polish_axes)
     return (fig, plot_axes, legend_axes)
+
+
+class SettingsFigure(plot.FigureTemplate):
+    """Reusable figure of settings, as from make_settings_fig.
+
+    Each render after the first only swaps the data of the setting steps
+    and fills, keeping the axes, tickers and labels of the first render.
+    """
+
+    def __init__(
+            self, column_title='Control Settings', fig_maker=make_fig_with_legends,
+            kwargs_make_fig={'num_cols': 1}, kwargs_plot_settings={},
+            kwargs_polish_axes={}
+    ):
+        """Set up the template with the arguments of make_settings_fig."""
+        super().__init__()
+        self.column_title = column_title
+        self.fig_maker = fig_maker
+        self.kwargs_make_fig = {**kwargs_make_fig, 'num_cols': 1}
+        self.kwargs_plot_settings = kwargs_plot_settings
+        self.kwargs_polish_axes = kwargs_polish_axes
+        self.artists = None  # (line, fill) of each setting, by column name
+
+    def draw(self, analysis, fig_title):
+        """Make the figure as make_settings_fig does, keeping its artists."""
+        (fig, plot_axes, legend_axes) = self.fig_maker(**self.kwargs_make_fig)
+        self.title = plot.add_fig_title(fig, fig_title)
+        plot.add_axes_title(plot_axes, self.column_title)
+        self.artists = plot_settings(
+            analysis.raw_signals, *plot_axes, **self.kwargs_plot_settings
+        )
+        plot.polish_axes(plot_axes, legend_axes, **self.kwargs_polish_axes)
+        return (fig, plot_axes, legend_axes)
+
+    def update(self, analysis):
+        """Replace the settings drawn with those of another analysis."""
+        series = settings_series(analysis.raw_signals, **{
+            name: self.kwargs_plot_settings[name] for name in ['start_time', 'end_time']
+            if name in self.kwargs_plot_settings
+        })
+        for (column_name, (line, fill)) in self.artists.items():
+            (times, values) = series[column_name]
+            line.set_data(times, values)
+            plot.set_fill_data(fill, times, values, step='post')
+        plot.rescale_x_axes(self.plot_axes)
@@ -0,0 +1,126 @@
+"""Segmentation of ventilator signals into breaths."""
+import numpy as np
+
+
+DEFAULT_FLOW_THRESHOLD = 5.0  # L/min, half-width of the flow hysteresis band
+DEFAULT_MIN_PRESSURE_RISE = 2.0  # cmH2O above the pressure at inspiration onset
+
+
+# SEGMENTATION
+
+def hysteresis_states(values, threshold):
+    """Classify each sample as above (1) or below (0) a hysteresis band around zero.
+
+    A sample keeps the state of the last sample outside the band of half-width
+    threshold, or is -1 if no sample so far has left the band.
+    """
+    indices = np.arange(len(values))
+    states = np.full(len(values), -1, dtype=np.int8)
+    states[values > threshold] = 1
+    states[values < -threshold] = 0
+    last_defined = np.maximum.accumulate(np.where(states >= 0, indices, -1))
+    return np.where(last_defined >= 0, states[np.maximum(last_defined, 0)], -1)
+
+
+def state_onsets(states, values):
+    """Find onsets of transitions between hysteresis states at zero crossings.
+
+    Returns the sample offsets of onsets into the above state and into the
+    below state. Each onset is moved back from where the band was left to just
+    after the last sample on the other side of zero.
+    """
+    indices = np.arange(len(values))
+    changes = np.flatnonzero(states[1:] != states[:-1]) + 1
+    changes = changes[states[changes - 1] >= 0]  # ignore leaving the initial state
+    rising = changes[states[changes] == 1]
+    falling = changes[states[changes] == 0]
+    last_nonpositive = np.maximum.accumulate(np.where(values <= 0, indices, -1))
+    last_nonnegative = np.maximum.accumulate(np.where(values >= 0, indices, -1))
+    return (last_nonpositive[rising] + 1, last_nonnegative[falling] + 1)
+
+
+def segment_breaths(
+        flow, pressure=None, flow_threshold=DEFAULT_FLOW_THRESHOLD,
+        min_pressure_rise=DEFAULT_MIN_PRESSURE_RISE
+):
+    """Segment flow (and optionally pressure) signals into complete breaths.
+
+    Inspiration and expiration onsets are zero crossings of flow confirmed by
+    flow leaving a hysteresis band of half-width flow_threshold. If pressure is
+    given, breaths whose peak inspiratory pressure does not rise at least
+    min_pressure_rise above the pressure at inspiration onset are discarded.
+    Returns arrays of sample offsets of inspiration onsets, expiration onsets
+    and (exclusive) breath ends, where each breath ends at the next onset.
+    """
+    flow = np.asarray(flow)
+    (inspirations, expirations) = state_onsets(
+        hysteresis_states(flow, flow_threshold), flow
+    )
+    # Pair each inspiration onset with the expiration onset following it
+    if len(inspirations) and len(expirations) and expirations[0] < inspirations[0]:
+        expirations = expirations[1:]
+    num_breaths = min(len(inspirations), len(expirations))
+    inspirations = inspirations[:num_breaths]
+    expirations = expirations[:num_breaths]
+
+    if pressure is not None and num_breaths:
+        pressure = np.asarray(pressure)
+        segment_bounds = np.ravel(np.column_stack((inspirations, expirations)))
+        peaks = np.maximum.reduceat(pressure, segment_bounds)[::2]
+        valid = peaks - pressure[inspirations] >= min_pressure_rise
+        inspirations = inspirations[valid]
+        expirations = expirations[valid]
+
+    # Only breaths followed by another inspiration onset are complete
+    ends = inspirations[1:]
+    return (
+        inspirations[:-1].astype(np.int64), expirations[:-1].astype(np.int64),
+        ends.astype(np.int64)
+    )
+
+
+# BREATH SETS
+
+class BreathSet(object):
+    """Breath segmentation of a raw signal set."""
+
+    def __init__(self):
+        """Make an empty breath set object."""
+        self.starts = None  # sample offsets of inspiration onsets
+        self.expiration_starts = None  # sample offsets of expiration onsets
+        self.ends = None  # sample offsets after the last sample of each breath
+
+    def segment(
+            self, raw_signal_set, flow_threshold=DEFAULT_FLOW_THRESHOLD,
+            min_pressure_rise=DEFAULT_MIN_PRESSURE_RISE
+    ):
+        """Segment the breaths of a RawSignalSet from its Flow and Paw signals.
+
+        If the signal set has no Flow signal, no breaths are found.
+        """
+        arrays = raw_signal_set.arrays
+        if 'Flow' not in arrays:
+            empty = np.zeros(0, dtype=np.int64)
+            (self.starts, self.expiration_starts, self.ends) = (empty, empty, empty)
+            return
+        (self.starts, self.expiration_starts, self.ends) = segment_breaths(
+            arrays['Flow'], pressure=arrays.get('Paw'),
+            flow_threshold=flow_threshold, min_pressure_rise=min_pressure_rise
+        )
+
+    @property
+    def num_breaths(self):
+        """Get the number of complete breaths."""
+        return len(self.starts)
+
+    def start_times(self, raw_signal_set):
+        """Get the times of inspiration onsets in a RawSignalSet."""
+        return raw_signal_set.time_array[self.starts]
+
+    def expiration_start_times(self, raw_signal_set):
+        """Get the times of expiration onsets in a RawSignalSet."""
+        return raw_signal_set.time_array[self.expiration_starts]
+
+    def end_times(self, raw_signal_set):
+        """Get the times of the ends of breaths in a RawSignalSet."""
+        return raw_signal_set.time_array[self.ends]
@@ -0,0 +1,147 @@
+"""Detection of control setting transitions and extraction of windows around them."""
+import numpy as np
+
+import pandas as pd
+
+
+WINDOW_UNITS = ['seconds', 'breaths']
+DEFAULT_WINDOW_BEFORE = 5
+DEFAULT_WINDOW_AFTER = 15
+DEFAULT_WINDOW_UNIT = 'seconds'
+
+
+# TRANSITIONS
+
+def setting_transitions(settings_runs):
+    """Find the transitions of control settings from their run-length encodings.
+
+    Settings_runs is a dict of RunLengthEncodings, as from
+    RawSignalSet.settings_runs. Returns a dict of arrays with the sample
+    offset (Index) of the first sample with each new setting, the name of the
+    setting, and its previous and current values, sorted by sample offset.
+    """
+    transitions = {
+        'Index': [np.zeros(0, dtype=np.int64)], 'Setting': [np.zeros(0, dtype=object)],
+        'Previous': [np.zeros(0)], 'Current': [np.zeros(0)]
+    }
+    for (column_name, encoding) in settings_runs.items():
+        values = encoding.values.astype('float64')
+        transitions['Index'].append(encoding.start_indices[1:])
+        transitions['Setting'].append(
+            np.full(encoding.num_runs - 1, column_name, dtype=object)
+        )
+        transitions['Previous'].append(values[:-1])
+        transitions['Current'].append(values[1:])
+    transitions = {
+        name: np.concatenate(arrays) for (name, arrays) in transitions.items()
+    }
+    order = np.argsort(transitions['Index'], kind='stable')
+    return {name: values[order] for (name, values) in transitions.items()}
+
+
+def window_bounds(
+        event_times, before=DEFAULT_WINDOW_BEFORE, after=DEFAULT_WINDOW_AFTER,
+        unit=DEFAULT_WINDOW_UNIT, breath_start_times=None, breath_end_times=None
+):
+    """Get the start and end times of windows around events.
+
+    If unit is 'seconds', windows span from before seconds before each event
+    to after seconds after it. If unit is 'breaths', windows span the before
+    complete breaths starting before each event and the after complete breaths
+    starting at or after it, given the start and end times of breaths; windows
+    are truncated at the first and last breaths.
+    """
+    event_times = np.asarray(event_times, dtype='float64')
+    if unit not in WINDOW_UNITS:
+        raise ValueError('Unknown window unit {}!'.format(unit))
+    if unit == 'seconds':
+        return (event_times - before, event_times + after)
+
+    if breath_start_times is None or not len(breath_start_times):
+        return (event_times.copy(), event_times.copy())
+    num_breaths = len(breath_start_times)
+    # Index of the first breath starting at or after each event
+    following = np.searchsorted(breath_start_times, event_times, side='left')
+    first = np.clip(following - int(before), 0, num_breaths - 1)
+    last = np.clip(following + int(after) - 1, 0, num_breaths - 1)
+    start_times = np.minimum(breath_start_times[first], event_times)
+    end_times = np.maximum(breath_end_times[last], event_times)
+    return (start_times, end_times)
+
+
+# EVENT TABLES
+
+class SettingEvents(object):
+    """Table of control setting transitions."""
+
+    def __init__(self):
+        """Make an empty events object."""
+        self.df = None  # a Pandas dataframe with one row per setting transition
+
+    def compute(self, raw_signal_set, breath_set=None):
+        """Find the setting transitions of a RawSignalSet.
+
+        If a BreathSet is given, each transition is also labeled with the
+        index of the first breath starting at or after it.
+        """
+        transitions = setting_transitions(raw_signal_set.settings_runs)
+        times = raw_signal_set.time_array
+        df = pd.DataFrame({
+            'Time': times[transitions['Index']] if times is not None else [],
+            **transitions
+        })
+        if breath_set is not None and breath_set.starts is not None:
+            df['Breath'] = np.searchsorted(
+                breath_set.start_times(raw_signal_set), df['Time'], side='left'
+            )
+        self.df = df
+
+    @property
+    def num_events(self):
+        """Get the number of setting transitions."""
+        return len(self.df)
+
+    def select(self, settings=None):
+        """Get the transitions of the given settings (or of all settings if None)."""
+        if settings is None:
+            return self.df
+        return self.df[self.df['Setting'].isin(settings)]
+
+    def windows(
+            self, raw_signal_set, breath_set=None, before=DEFAULT_WINDOW_BEFORE,
+            after=DEFAULT_WINDOW_AFTER, unit=DEFAULT_WINDOW_UNIT, settings=None
+    ):
+        """Get a window around each transition of the given settings.
+
+        Returns the selected transitions with StartTime and EndTime columns
+        added, as from window_bounds. A BreathSet is required if unit is
+        'breaths', and each transition is then also labeled (in a Breath
+        column) with the index of the first breath starting at or after it.
+        """
+        df = self.select(settings=settings).copy()
+        breath_start_times = None
+        breath_end_times = None
+        if unit == 'breaths':
+            if breath_set is None or breath_set.starts is None:
+                raise ValueError('Windows in units of breaths require a BreathSet!')
+            breath_start_times = breath_set.start_times(raw_signal_set)
+            breath_end_times = breath_set.end_times(raw_signal_set)
+            if 'Breath' not in df.columns:
+                df['Breath'] = np.searchsorted(
+                    breath_start_times, df['Time'].to_numpy(), side='left'
+                )
+        (df['StartTime'], df['EndTime']) = window_bounds(
+            df['Time'].to_numpy(), before=before, after=after, unit=unit,
+            breath_start_times=breath_start_times, breath_end_times=breath_end_times
+        )
+        return df.reset_index(drop=True)
+
+    # FILES
+
+    def save_csv(self, path):
+        """Save the events table to a CSV file."""
+        self.df.to_csv(path, index_label='Event')
+
+    def load_csv(self, path):
+        """Load the events table from a CSV file."""
+        self.df = pd.read_csv(path, index_col='Event')
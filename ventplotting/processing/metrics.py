@@ -0,0 +1,105 @@
+"""Per-breath metrics of ventilator signals."""
+import numpy as np
+
+import pandas as pd
+
+
+# Measured metrics compared against control settings of the same name
+SETTING_METRICS = ['Vt', 'Ti', 'RR', 'PEEP']
+
+
+# METRICS
+
+def segment_reduce(ufunc, values, starts, expiration_starts, ends):
+    """Reduce values over the inspiration and expiration segments of breaths.
+
+    Returns arrays of the reductions over [start, expiration start) and over
+    [expiration start, end) for each breath, computed with one ufunc.reduceat.
+    """
+    if not len(starts):
+        return (np.zeros(0), np.zeros(0))
+    bounds = np.ravel(np.column_stack((starts, expiration_starts, ends)))
+    # The segment from each end to the next start is reduced but ignored; ends
+    # are never at the end of the signal, since each breath ends at an onset.
+    reduced = ufunc.reduceat(values, bounds)
+    return (reduced[0::3], reduced[1::3])
+
+
+def compute_breath_metrics(
+        arrays, starts, expiration_starts, ends, settings_runs={}
+):
+    """Compute a table of metrics for each breath from a dict of signal arrays.
+
+    Measured metrics are PIP, end-expiratory pressure (PEEP), delivered tidal
+    volume (Vt), inspiratory and expiratory times (Ti, Te), I:E ratio (IE),
+    respiratory rate (RR) and peak inspiratory flow (PeakFlow). For each
+    control setting column present in arrays or in settings_runs (a dict of
+    RunLengthEncodings), the setting at the start of each breath is included
+    with a Set prefix (e.g. SetVt).
+    """
+    times = arrays['Time']
+    metrics = {
+        'Start': times[starts],
+        'End': times[ends],
+        'Ti': times[expiration_starts] - times[starts],
+        'Te': times[ends] - times[expiration_starts]
+    }
+    metrics['IE'] = metrics['Ti'] / metrics['Te']
+    metrics['RR'] = 60 / (metrics['End'] - metrics['Start'])
+    if 'Paw' in arrays:
+        (metrics['PIP'], _) = segment_reduce(
+            np.maximum, arrays['Paw'], starts, expiration_starts, ends
+        )
+        metrics['PEEP'] = arrays['Paw'][ends - 1]
+    if 'Volume' in arrays:
+        (peak_volumes, _) = segment_reduce(
+            np.maximum, arrays['Volume'], starts, expiration_starts, ends
+        )
+        metrics['Vt'] = peak_volumes - arrays['Volume'][starts]
+    if 'Flow' in arrays:
+        (metrics['PeakFlow'], _) = segment_reduce(
+            np.maximum, arrays['Flow'], starts, expiration_starts, ends
+        )
+    for setting in SETTING_METRICS:
+        if setting in arrays:
+            metrics['Set' + setting] = arrays[setting][starts]
+        elif setting in settings_runs:
+            metrics['Set' + setting] = settings_runs[setting].values_at_indices(starts)
+    return pd.DataFrame({
+        name: np.asarray(values, dtype='float64') for (name, values) in metrics.items()
+    })
+
+
+# METRICS TABLES
+
+class BreathMetrics(object):
+    """Table of per-breath metrics."""
+
+    def __init__(self):
+        """Make an empty metrics object."""
+        self.df = None  # a Pandas dataframe with one row per breath
+
+    def compute(self, raw_signal_set, breath_set):
+        """Compute the metrics of each breath of a BreathSet in a RawSignalSet."""
+        self.df = compute_breath_metrics(
+            raw_signal_set.arrays, breath_set.starts, breath_set.expiration_starts,
+            breath_set.ends, settings_runs=raw_signal_set.settings_runs
+        )
+
+    def setting_errors(self):
+        """Get the differences between measured metrics and their control settings."""
+        return pd.DataFrame({
+            setting: self.df[setting] - self.df['Set' + setting]
+            for setting in SETTING_METRICS
+            if setting in self.df.columns and 'Set' + setting in self.df.columns
+        })
+
+    # FILES
+
+    def save_csv(self, path):
+        """Save the metrics table to a CSV file."""
+        self.df.to_csv(path, index_label='Breath')
+
+    def load_csv(self, path):
+        """Load the metrics table from a CSV file."""
+        self.df = pd.read_csv(path, index_col='Breath')
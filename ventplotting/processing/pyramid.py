@@ -0,0 +1,242 @@
+"""Multi-resolution min/max summaries of signals for fast overview plotting."""
+import json
+
+import numpy as np
+
+from ventplotting.utilities import paths
+from ventplotting.utilities import timeseries
+
+
+DEFAULT_BASE_BUCKET_SIZE = 16  # samples per bucket in the finest summary level
+PYRAMID_FORMAT_VERSION = 1
+BUCKET_FIELDS = [
+    'min', 'max', 'min_time', 'max_time', 'sum', 'count', 'start_time', 'end_time'
+]
+
+
+# LEVELS
+
+def summarize_buckets(times, values, bucket_size):
+    """Summarize consecutive buckets of bucket_size samples as a dict of arrays.
+
+    The last bucket may be partial.
+    """
+    num_values = len(values)
+    bucket_starts = np.arange(0, num_values, bucket_size)
+    mins = np.minimum.reduceat(values, bucket_starts)
+    maxs = np.maximum.reduceat(values, bucket_starts)
+    # argmin/argmax over full buckets by reshaping, then the partial bucket
+    num_full_buckets = num_values // bucket_size
+    full_size = num_full_buckets * bucket_size
+    buckets = values[:full_size].reshape(num_full_buckets, bucket_size)
+    min_indices = bucket_starts[:num_full_buckets] + np.argmin(buckets, axis=1)
+    max_indices = bucket_starts[:num_full_buckets] + np.argmax(buckets, axis=1)
+    if full_size < num_values:
+        min_indices = np.append(min_indices, full_size + np.argmin(values[full_size:]))
+        max_indices = np.append(max_indices, full_size + np.argmax(values[full_size:]))
+    bucket_ends = np.append(bucket_starts[1:], num_values) - 1
+    return {
+        'min': mins,
+        'max': maxs,
+        'min_time': times[min_indices],
+        'max_time': times[max_indices],
+        'sum': np.add.reduceat(values.astype('float64'), bucket_starts),
+        'count': np.diff(np.append(bucket_starts, num_values)),
+        'start_time': times[bucket_starts],
+        'end_time': times[bucket_ends]
+    }
+
+
+def merge_buckets(level):
+    """Summarize a level's buckets in pairs into a level of half the resolution."""
+    num_buckets = len(level['min'])
+    left = {field: values[0::2] for (field, values) in level.items()}
+    # An unpaired last bucket is merged with itself, contributing no extra counts
+    right_indices = np.minimum(np.arange(1, num_buckets + 1, 2), num_buckets - 1)
+    right = {field: values[right_indices] for (field, values) in level.items()}
+    if num_buckets % 2:
+        right['sum'][-1] = 0
+        right['count'][-1] = 0
+    use_left_min = left['min'] <= right['min']
+    use_left_max = left['max'] >= right['max']
+    return {
+        'min': np.where(use_left_min, left['min'], right['min']),
+        'max': np.where(use_left_max, left['max'], right['max']),
+        'min_time': np.where(use_left_min, left['min_time'], right['min_time']),
+        'max_time': np.where(use_left_max, left['max_time'], right['max_time']),
+        'sum': left['sum'] + right['sum'],
+        'count': left['count'] + right['count'],
+        'start_time': left['start_time'],
+        'end_time': right['end_time']
+    }
+
+
+def build_levels(times, values, base_bucket_size=DEFAULT_BASE_BUCKET_SIZE):
+    """Build summary levels with bucket sizes doubling from base_bucket_size.
+
+    Levels are built until a level has a single bucket.
+    """
+    levels = [summarize_buckets(times, values, base_bucket_size)]
+    while len(levels[-1]['min']) > 1:
+        levels.append(merge_buckets(levels[-1]))
+    return levels
+
+
+# PYRAMIDS
+
+class SignalPyramid(object):
+    """Multi-resolution min/max/mean summary of the signals of a RawSignalSet."""
+
+    def __init__(self):
+        """Make an empty pyramid object."""
+        self.times = None  # sorted relative times of the raw samples
+        self.columns = {}  # lists of summary levels, by column name
+        self.base_bucket_size = DEFAULT_BASE_BUCKET_SIZE
+        self.source = None  # identity of the source data and build parameters, if known
+
+    def build(
+            self, raw_signal_set, column_names=None,
+            base_bucket_size=DEFAULT_BASE_BUCKET_SIZE
+    ):
+        """Build summary levels for columns of a RawSignalSet (default: all but Time)."""
+        arrays = raw_signal_set.arrays
+        if column_names is None:
+            column_names = [name for name in arrays.keys() if name != 'Time']
+        self.times = raw_signal_set.time_array
+        self.base_bucket_size = base_bucket_size
+        self.columns = {
+            column_name: build_levels(
+                self.times, arrays[column_name], base_bucket_size=base_bucket_size
+            )
+            for column_name in column_names
+        }
+        return self
+
+    def level_bucket_size(self, level):
+        """Get the number of samples per bucket at a level."""
+        return self.base_bucket_size * 2 ** level
+
+    def query(
+            self, column_name, start_time=None, end_time=None, max_points=1000,
+            raw_signal_set=None, statistic='minmax'
+    ):
+        """Get (times, values) of a column between two times with at most max_points.
+
+        The coarsest resolution with enough points is chosen: the raw samples
+        of raw_signal_set if given and few enough, or else the finest summary
+        level with few enough buckets in the interval. The statistic may be
+        'minmax' (each bucket's min and max, in time order) or 'mean' (each
+        bucket's mean, at the bucket's start time).
+        """
+        (start, end) = timeseries.interval_bounds(self.times, start_time, end_time)
+        if raw_signal_set is not None and end - start <= max_points:
+            arrays = raw_signal_set.arrays
+            return (arrays['Time'][start:end], arrays[column_name][start:end])
+
+        points_per_bucket = 2 if statistic == 'minmax' else 1
+        levels = self.columns[column_name]
+        for level in levels:
+            (bucket_start, bucket_end) = bucket_bounds(level, start_time, end_time)
+            if (bucket_end - bucket_start) * points_per_bucket <= max_points:
+                break
+        buckets = {
+            field: values[bucket_start:bucket_end] for (field, values) in level.items()
+        }
+        # Buckets at the edges of the interval may extend beyond it
+        if start_time is not None or end_time is not None:
+            for field in ['min_time', 'max_time', 'start_time']:
+                buckets[field] = np.clip(buckets[field], start_time, end_time)
+        if statistic == 'mean':
+            return (buckets['start_time'], buckets['sum'] / buckets['count'])
+        if statistic != 'minmax':
+            raise ValueError('Unknown pyramid statistic {}!'.format(statistic))
+        min_first = buckets['min_time'] <= buckets['max_time']
+        times = np.ravel(np.column_stack((
+            np.where(min_first, buckets['min_time'], buckets['max_time']),
+            np.where(min_first, buckets['max_time'], buckets['min_time'])
+        )))
+        values = np.ravel(np.column_stack((
+            np.where(min_first, buckets['min'], buckets['max']),
+            np.where(min_first, buckets['max'], buckets['min'])
+        )))
+        return (times, values)
+
+    # FILES
+
+    def save_npz(self, path):
+        """Save the pyramid to a npz file."""
+        arrays = {'times': self.times}
+        for (column_name, levels) in self.columns.items():
+            for (i, level) in enumerate(levels):
+                for (field, values) in level.items():
+                    arrays['{}/{}/{}'.format(column_name, i, field)] = values
+        header = {
+            'version': PYRAMID_FORMAT_VERSION,
+            'base_bucket_size': self.base_bucket_size,
+            'columns': {name: len(levels) for (name, levels) in self.columns.items()},
+            'source': self.source
+        }
+        np.savez(path, header=np.array(json.dumps(header)), **arrays)
+
+    def load_npz(self, path):
+        """Load the pyramid from a npz file."""
+        with np.load(path) as arrays:
+            header = json.loads(str(arrays['header']))
+            if header['version'] != PYRAMID_FORMAT_VERSION:
+                raise ValueError('Unsupported pyramid file version in {}!'.format(path))
+            self.times = arrays['times']
+            self.base_bucket_size = header['base_bucket_size']
+            self.source = header['source']
+            self.columns = {
+                column_name: [
+                    {
+                        field: arrays['{}/{}/{}'.format(column_name, i, field)]
+                        for field in BUCKET_FIELDS
+                    }
+                    for i in range(num_levels)
+                ]
+                for (column_name, num_levels) in header['columns'].items()
+            }
+        return self
+
+
+def bucket_bounds(level, start_time=None, end_time=None):
+    """Get the index bounds of the buckets of a level overlapping an interval."""
+    start = 0 if start_time is None else np.searchsorted(
+        level['end_time'], start_time
+    )
+    end = len(level['min']) if end_time is None else np.searchsorted(
+        level['start_time'], end_time, side='right'
+    )
+    return (start, end)
+
+
+def load_pyramid(raw_signal_set, name, dir, **kwargs):
+    """Load the pyramid saved next to a data file, building and saving it if needed.
+
+    A saved pyramid is rebuilt if the data file has changed since it was saved,
+    or if it was built from a signal set loaded with different columns or with
+    different keyword arguments, which are passed to SignalPyramid.build.
+    Signal sets which were not loaded from a file, such as signal windows, can't
+    be matched to a saved pyramid, so their pyramids are built without saving.
+    """
+    if raw_signal_set.source is None:
+        return SignalPyramid().build(raw_signal_set, **kwargs)
+    pyramid_path = paths.pyramid_npz_name_to_path(name, dir=dir)
+    data_source = raw_signal_set.source  # includes the loaded columns
+    # Normalized as in the JSON header of saved pyramids, for comparison
+    build_params = {
+        'column_names': kwargs.get('column_names'),
+        'base_bucket_size': kwargs.get('base_bucket_size', DEFAULT_BASE_BUCKET_SIZE)
+    }
+    source = json.loads(json.dumps({'data': data_source, 'build': build_params}))
+    try:
+        pyramid = SignalPyramid().load_npz(pyramid_path)
+        if pyramid.source == source:
+            return pyramid
+    except (OSError, ValueError, KeyError):
+        pass
+    pyramid = SignalPyramid().build(raw_signal_set, **kwargs)
+    pyramid.source = source
+    pyramid.save_npz(pyramid_path)
+    return pyramid
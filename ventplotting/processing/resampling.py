@@ -0,0 +1,161 @@
+"""Resampling of irregularly-sampled signals onto uniform time grids."""
+import numpy as np
+
+import pandas as pd
+
+from ventplotting.files import signals
+
+
+RESAMPLING_METHODS = ['linear', 'nearest', 'previous']
+DEFAULT_RATE = 20.0  # Hz, slightly faster than the ~45-50 ms logging interval
+DEFAULT_METHOD = 'linear'
+DEFAULT_GAP_FACTOR = 3.0  # intervals this many times the median interval are gaps
+
+
+# SAMPLING STATISTICS
+
+class SamplingStats(object):
+    """Statistics of the intervals between sample times."""
+
+    def __init__(self, times, gap_factor=DEFAULT_GAP_FACTOR):
+        """Compute the statistics of a sorted array of sample times in seconds.
+
+        Intervals longer than gap_factor times the median interval are gaps.
+        """
+        times = np.asarray(times, dtype='float64')
+        intervals = np.diff(times)
+        self.num_samples = len(times)
+        self.duration = float(times[-1] - times[0]) if len(times) else 0.0
+        if len(intervals):
+            self.median_interval = float(np.median(intervals))
+            self.mean_interval = float(np.mean(intervals))
+            self.jitter = float(np.std(intervals))  # s, std of intervals
+            self.max_interval = float(np.max(intervals))
+        else:
+            self.median_interval = np.nan
+            self.mean_interval = np.nan
+            self.jitter = np.nan
+            self.max_interval = np.nan
+        gaps = np.flatnonzero(intervals > gap_factor * self.median_interval)
+        self.gap_start_times = times[gaps]
+        self.gap_end_times = times[gaps + 1]
+
+    @property
+    def native_rate(self):
+        """Get the estimated native sample rate in Hz, from the median interval."""
+        return 1 / self.median_interval
+
+    @property
+    def num_gaps(self):
+        """Get the number of gaps between samples."""
+        return len(self.gap_start_times)
+
+    def gaps(self):
+        """Get a dataframe of the start and end times of each gap."""
+        return pd.DataFrame({
+            'StartTime': self.gap_start_times, 'EndTime': self.gap_end_times,
+            'Duration': self.gap_end_times - self.gap_start_times
+        })
+
+    def as_dict(self):
+        """Return the statistics as a dict."""
+        return {
+            'num_samples': self.num_samples, 'duration': self.duration,
+            'native_rate': self.native_rate, 'median_interval': self.median_interval,
+            'mean_interval': self.mean_interval, 'jitter': self.jitter,
+            'max_interval': self.max_interval, 'num_gaps': self.num_gaps
+        }
+
+    def __repr__(self):
+        """Represent the statistics."""
+        return 'SamplingStats({})'.format(
+            ', '.join('{}={}'.format(*item) for item in self.as_dict().items())
+        )
+
+
+# RESAMPLING
+
+def uniform_grid(start_time, end_time, rate):
+    """Get the times of a uniform grid at rate Hz between two times, inclusive."""
+    num_samples = int(np.floor((end_time - start_time) * rate + 1e-9)) + 1
+    return start_time + np.arange(max(num_samples, 0)) / rate
+
+
+def resample_values(times, values, grid_times, method=DEFAULT_METHOD):
+    """Resample values at sorted sample times onto grid times, in one vectorized pass.
+
+    Methods are 'linear' interpolation, 'nearest' sample, or 'previous'
+    sample (a zero-order hold, for piecewise-constant signals). The grid
+    must lie within the sample times.
+    """
+    if method not in RESAMPLING_METHODS:
+        raise ValueError('Unknown resampling method {}!'.format(method))
+    if method == 'linear':
+        return np.interp(grid_times, times, values.astype('float64')).astype(
+            np.result_type(values.dtype, np.float32)
+        )
+    following = np.searchsorted(times, grid_times, side='right')
+    previous = np.clip(following - 1, 0, len(times) - 1)
+    if method == 'nearest':
+        following = np.minimum(following, len(times) - 1)
+        following_closer = (
+            (times[following] - grid_times) < (grid_times - times[previous])
+        )
+        previous = np.where(following_closer, following, previous)
+    return values[previous]
+
+
+def mask_gaps(grid_times, values, sampling_stats):
+    """Set resampled values falling within gaps of the sample times to NaN."""
+    (starts, ends) = (
+        np.searchsorted(grid_times, sampling_stats.gap_start_times, side='right'),
+        np.searchsorted(grid_times, sampling_stats.gap_end_times, side='left')
+    )
+    in_gap = np.zeros(len(grid_times) + 1, dtype=np.int64)
+    np.add.at(in_gap, starts, 1)
+    np.add.at(in_gap, ends, -1)
+    in_gap = np.cumsum(in_gap[:-1]) > 0
+    values = values.astype(np.result_type(values.dtype, np.float32))
+    values[in_gap] = np.nan
+    return values
+
+
+def resample(
+        raw_signal_set, rate=DEFAULT_RATE, method=DEFAULT_METHOD,
+        sampling_stats=None, gap_factor=DEFAULT_GAP_FACTOR, mask=True
+):
+    """Resample a RawSignalSet onto a uniform grid at rate Hz.
+
+    Waveform columns are resampled with the given method, while setting
+    columns are always resampled with the 'previous' method. If mask is
+    True, resampled waveform values within gaps of the sample times are NaN.
+    Returns a new RawSignalSet.
+    """
+    if sampling_stats is None:
+        sampling_stats = SamplingStats(raw_signal_set.time_array, gap_factor=gap_factor)
+    arrays = raw_signal_set.arrays
+    times = arrays['Time']
+    grid_times = uniform_grid(times[0], times[-1], rate) if len(times) else times
+    columns = {'Time': grid_times}
+    for (column_name, values) in arrays.items():
+        if column_name == 'Time':
+            continue
+        if column_name in signals.SETTING_COLUMNS:
+            columns[column_name] = resample_values(
+                times, values, grid_times, method='previous'
+            )
+            continue
+        resampled = resample_values(times, values, grid_times, method=method)
+        if mask and sampling_stats.num_gaps:
+            resampled = mask_gaps(grid_times, resampled, sampling_stats)
+        columns[column_name] = resampled
+    for (column_name, encoding) in (
+        raw_signal_set.settings_runs.items() if raw_signal_set.settings_compressed
+        else []
+    ):
+        columns[column_name] = encoding.values_at_indices(
+            np.searchsorted(times, grid_times, side='right') - 1
+        )
+    resampled_signal_set = signals.RawSignalSet()
+    resampled_signal_set.load_df(pd.DataFrame(columns))
+    return resampled_signal_set
@@ -34,6 +34,11 @@ def csv_name_to_path(name, suffix='', dir=EXAMPLES_PATH):
     return name_to_path(name, file_ext='csv', dir=dir, suffix=suffix)
 
 
+def breath_metrics_csv_name_to_path(name, dir=EXAMPLES_PATH):
+    """Get the file path from the name of a per-breath metrics csv file."""
+    return csv_name_to_path(name, dir=dir, suffix='breath_metrics')
+
+
 def json_name_to_path(name, suffix='', dir=EXAMPLES_PATH):
     """Get the file path from the name of a generic json file."""
     return name_to_path(name, file_ext='json', dir=dir, suffix=suffix)
@@ -44,6 +49,21 @@ def mat_name_to_path(name, suffix='', dir=EXAMPLES_PATH):
     return name_to_path(name, file_ext='mat', dir=dir, suffix=suffix)
 
 
+def npz_name_to_path(name, suffix='', dir=EXAMPLES_PATH):
+    """Get the file path from the name of a generic npz file."""
+    return name_to_path(name, file_ext='npz', dir=dir, suffix=suffix)
+
+
+def pyramid_npz_name_to_path(name, dir=EXAMPLES_PATH):
+    """Get the file path from the name of a signal pyramid npz file."""
+    return npz_name_to_path(name, dir=dir, suffix='pyramid')
+
+
+def stages_json_name_to_path(name, dir=EXAMPLES_PATH):
+    """Get the file path from the name of an analysis stage parameters json file."""
+    return json_name_to_path(name, dir=dir, suffix='stages')
+
+
 def metadata_json_name_to_path(name, dir=EXAMPLES_PATH):
     """Get the file path from the name of a metadata json file."""
     return json_name_to_path(name, dir=dir, suffix='metadata')
@@ -0,0 +1,132 @@
+"""Run-length encoding of piecewise-constant timeseries."""
+import numpy as np
+
+
+def change_indices(values):
+    """Get the indices of the samples which differ from their previous sample.
+
+    Consecutive NaNs are considered equal.
+    """
+    values = np.asarray(values)
+    previous = values[:-1]
+    current = values[1:]
+    changed = previous != current
+    if values.dtype.kind == 'f':
+        changed &= ~(np.isnan(previous) & np.isnan(current))
+    return np.flatnonzero(changed) + 1
+
+
+class RunLengthEncoding(object):
+    """Run-length encoding of a column of samples at sorted times.
+
+    Each run of equal consecutive samples is stored as the index and time of
+    its first sample and its value, so a column which rarely changes takes
+    memory proportional to its number of changes rather than its length.
+    """
+
+    def __init__(self):
+        """Make an empty encoding."""
+        self.start_indices = np.array([], dtype='int64')  # first sample of each run
+        self.start_times = np.array([], dtype='float64')  # time of that sample
+        self.values = np.array([])  # value of each run
+        self.num_samples = 0
+        self.end_time = None  # time of the last sample
+
+    def encode(self, times, values):
+        """Encode a column of values at sorted times in one vectorized pass."""
+        times = np.asarray(times)
+        values = np.asarray(values)
+        self.num_samples = len(values)
+        if not self.num_samples:
+            return self
+        self.start_indices = np.concatenate(([0], change_indices(values)))
+        self.start_times = times[self.start_indices]
+        self.values = values[self.start_indices]
+        self.end_time = times[-1]
+        return self
+
+    @property
+    def num_runs(self):
+        """Get the number of runs."""
+        return len(self.values)
+
+    @property
+    def nbytes(self):
+        """Get the memory used by the encoding's arrays in bytes."""
+        return self.start_indices.nbytes + self.start_times.nbytes + self.values.nbytes
+
+    @property
+    def run_lengths(self):
+        """Get the number of samples in each run."""
+        return np.diff(np.append(self.start_indices, self.num_samples))
+
+    def decode(self):
+        """Get the full column of values."""
+        return np.repeat(self.values, self.run_lengths)
+
+    def values_at_indices(self, indices):
+        """Get the values of samples by their indices, in O(log n) per index."""
+        runs = np.searchsorted(self.start_indices, indices, side='right') - 1
+        return self.values[runs]
+
+    def slice(self, start, end, times):
+        """Get the encoding of the samples in [start, end), given all sample times."""
+        encoding = RunLengthEncoding()
+        end = min(end, self.num_samples)
+        if end <= start:
+            return encoding
+        first = int(np.searchsorted(self.start_indices, start, side='right')) - 1
+        last = int(np.searchsorted(self.start_indices, end, side='left'))
+        encoding.start_indices = np.maximum(self.start_indices[first:last] - start, 0)
+        encoding.start_times = times[encoding.start_indices + start]
+        encoding.values = self.values[first:last]
+        encoding.num_samples = end - start
+        encoding.end_time = times[end - 1]
+        return encoding
+
+    def value_at(self, time):
+        """Get the value at a time (or array of times), in O(log n) per time.
+
+        Times before the first sample or after the last sample are NaN.
+        """
+        time = np.asarray(time, dtype='float64')
+        if not self.num_runs:
+            return np.full(time.shape, np.nan)[()]
+        runs = np.searchsorted(self.start_times, time, side='right') - 1
+        values = self.values[np.maximum(runs, 0)].astype('float64')
+        outside = (runs < 0) | (time > self.end_time)
+        return np.where(outside, np.nan, values)[()]
+
+    def step_points(self, start_time=None, end_time=None):
+        """Get the (times, values) of a step plot of the runs between two times.
+
+        The points are the starts of the runs overlapping the interval (with
+        the first clipped to start_time), plus a final point repeating the
+        last value at the end of the interval, for drawing with steps which
+        hold each value until the next point (where='post' in matplotlib).
+        """
+        if not self.num_runs:
+            return (np.array([]), np.array([]))
+        first_time = self.start_times[0]
+        if start_time is None or start_time < first_time:
+            start_time = first_time
+        if end_time is None or end_time > self.end_time:
+            end_time = self.end_time
+        if end_time < start_time:
+            return (np.array([]), np.array([]))
+        first = int(np.searchsorted(self.start_times, start_time, side='right')) - 1
+        first = max(first, 0)
+        last = int(np.searchsorted(self.start_times, end_time, side='right'))
+        times = np.append(self.start_times[first:last], end_time)
+        times[0] = start_time
+        values = np.append(self.values[first:last], self.values[last - 1])
+        return (times, values)
+
+
+def joint_run_starts(encodings):
+    """Get the start indices of runs in which none of several encodings change."""
+    if not encodings:
+        return np.array([], dtype='int64')
+    return np.unique(np.concatenate([
+        encoding.start_indices for encoding in encodings
+    ]))
@@ -0,0 +1,279 @@
+"""Lazily-computed and memoized stages of a dependency graph."""
+import collections
+import hashlib
+import inspect
+import itertools
+import os
+import sys
+
+
+_versions = itertools.count(1)  # versions of source stage values, unique per process
+_source_hashes = {}  # hashes of source files, by path, modification time and size
+
+
+def params_key(params):
+    """Make a hashable key from a dict of parameters."""
+    return repr(sorted(params.items()))
+
+
+def source_fingerprint(modules):
+    """Hash the source files of modules, so that any edit to them changes the hash."""
+    hasher = hashlib.sha1()
+    for module in sorted(modules, key=lambda module: module.__name__):
+        path = inspect.getsourcefile(module) or module.__file__
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        if key not in _source_hashes:
+            with open(path, 'rb') as f:
+                _source_hashes[key] = hashlib.sha1(f.read()).hexdigest()
+        hasher.update('{}:{};'.format(module.__name__, _source_hashes[key]).encode())
+    return hasher.hexdigest()
+
+
+# STAGES
+
+class Stage(object):
+    """Declaration of an analysis stage.
+
+    A stage is computed by calling compute with the results of its
+    dependencies (as positional arguments, in order) and its parameters (as
+    keyword arguments). A source stage has no compute function, and its value
+    is only ever set. Optionally, state is a function of a source value
+    returning an object which is replaced whenever the value is modified in
+    place (e.g. the dataframe of a RawSignalSet), so such modifications also
+    invalidate the stages which depend on the value.
+
+    Results can also be persisted in a store shared between processes. A
+    source stage then needs an identity function of its value, returning a
+    JSON-serializable identity of its contents (or None if it has none), and
+    a persisted stage needs dump and load functions converting its results to
+    and from dicts of arrays. Persisted results are keyed by a fingerprint
+    of the source of the module defining compute and of the modules in code
+    (which should include all modules its computation depends on), so that
+    editing them invalidates the results. The version of a persisted stage
+    must be incremented whenever its computation changes in any other way.
+    """
+
+    def __init__(
+            self, name, compute=None, dependencies=[], params={}, state=None,
+            identity=None, dump=None, load=None, version=1, code=[]
+    ):
+        """Declare the stage."""
+        self.name = name
+        self.compute = compute
+        self.dependencies = list(dependencies)
+        self.params = dict(params)  # default parameters
+        self.state = state
+        self.identity = identity
+        self.dump = dump
+        self.load = load
+        self.version = version
+        self.code = list(code)
+
+    @property
+    def is_source(self):
+        """Check whether the stage is a source stage."""
+        return self.compute is None
+
+    def code_fingerprint(self):
+        """Get a fingerprint of the source code of the stage's computation."""
+        modules = set(self.code)
+        if self.compute is not None:
+            modules.add(sys.modules[self.compute.__module__])
+        return source_fingerprint(modules)
+
+
+class StageMemo(object):
+    """Memoized results of a stage, which may be shared between linked graphs."""
+
+    def __init__(self, stage):
+        """Initialize the memo with the default parameters of the stage."""
+        self.params = dict(stage.params)
+        self.results = {}  # (result, input signature) pairs by parameters key
+        self.version = None  # version of the value of a source stage
+        self.state = None  # state object of the value of a source stage
+
+
+# GRAPHS
+
+class StageGraph(object):
+    """Graph of stages computed lazily on first access and memoized.
+
+    Each memoized result records a signature of its inputs: the parameters
+    of the stage and of all stages upstream of it, and the versions of the
+    values of all source stages upstream of it. A result is only reused
+    while its signature is unchanged, so setting a new source value or
+    changing the parameters of any upstream stage invalidates it, while
+    downstream stages which are never accessed are never computed.
+
+    If a store (such as a files.results.ResultStore) is given, results of
+    persisted stages are also loaded from it before being computed, and are
+    saved to it after being computed, keyed by their persistent signatures.
+    """
+
+    def __init__(self, stages, store=None):
+        """Make a graph of stages with nothing computed yet."""
+        self.stages = collections.OrderedDict(
+            (stage.name, stage) for stage in stages
+        )
+        self.memos = {name: StageMemo(stage) for (name, stage) in self.stages.items()}
+        self.store = store
+        self.computations = collections.Counter()  # numbers of computations by stage
+        self.loads = collections.Counter()  # numbers of loads from the store by stage
+
+    def ancestors(self, name):
+        """Get the names of all stages upstream of a stage."""
+        ancestors = set()
+        pending = list(self.stages[name].dependencies)
+        while pending:
+            dependency = pending.pop()
+            if dependency not in ancestors:
+                ancestors.add(dependency)
+                pending.extend(self.stages[dependency].dependencies)
+        return ancestors
+
+    def link(self, graph, names):
+        """Share the memos of the named stages with another graph, without copying.
+
+        Linked stages must include all of their ancestors, so that both
+        graphs agree on the inputs of the linked results.
+        """
+        for name in names:
+            self.memos[name] = graph.memos[name]
+
+    # Parameters
+
+    def params(self, name):
+        """Get the current default parameters of a stage."""
+        return dict(self.memos[name].params)
+
+    def set_params(self, name, **params):
+        """Update the default parameters of a stage.
+
+        Results computed with different parameters, including results of
+        downstream stages, will be recomputed when they are next accessed.
+        """
+        self.memos[name].params.update(params)
+
+    # Results
+
+    def signature(self, name, **params):
+        """Get the signature of the inputs of a stage with the given parameters."""
+        stage = self.stages[name]
+        if stage.is_source:
+            return ('source', name, self._source_version(name))
+        return (
+            name, params_key({**self.memos[name].params, **params}),
+            tuple(self.signature(dependency) for dependency in stage.dependencies)
+        )
+
+    def persistent_signature(self, name, **params):
+        """Get a signature of the inputs of a stage which is stable across processes.
+
+        Source values are represented by their identities instead of their
+        versions. Returns None if any source upstream has no identity.
+        """
+        stage = self.stages[name]
+        if stage.is_source:
+            memo = self.memos[name]
+            if stage.identity is None or not memo.results:
+                return None
+            identity = stage.identity(memo.results[''][0])
+            return None if identity is None else (name, identity)
+        dependencies = [
+            self.persistent_signature(dependency) for dependency in stage.dependencies
+        ]
+        if any(dependency is None for dependency in dependencies):
+            return None
+        return (
+            name, stage.version, stage.code_fingerprint(),
+            params_key({**self.memos[name].params, **params}), dependencies
+        )
+
+    def _source_version(self, name):
+        memo = self.memos[name]
+        state_function = self.stages[name].state
+        if state_function is not None and memo.results:
+            (value, _) = memo.results['']
+            state = state_function(value)
+            if state is not memo.state:
+                memo.state = state
+                memo.version = next(_versions)
+        return memo.version
+
+    def is_current(self, name, **params):
+        """Check whether a stage has a memoized result valid for its current inputs."""
+        memo = self.memos[name]
+        if self.stages[name].is_source:
+            return bool(memo.results)
+        key = params_key({**memo.params, **params})
+        return (
+            key in memo.results
+            and memo.results[key][1] == self.signature(name, **params)
+        )
+
+    def get(self, name, **params):
+        """Get the result of a stage, computing it and its inputs only as needed.
+
+        Keyword arguments override the default parameters of the stage, and
+        results are memoized separately for each set of parameters.
+        """
+        stage = self.stages[name]
+        memo = self.memos[name]
+        if stage.is_source:
+            if not memo.results:
+                raise KeyError('Source stage {} has not been set!'.format(name))
+            return memo.results[''][0]
+        signature = self.signature(name, **params)
+        stage_params = {**memo.params, **params}
+        key = params_key(stage_params)
+        if key in memo.results and memo.results[key][1] == signature:
+            return memo.results[key][0]
+        persistent_signature = None
+        if self.store is not None and stage.dump is not None:
+            persistent_signature = self.persistent_signature(name, **params)
+        result = None
+        if persistent_signature is not None:
+            columns = self.store.load_result(persistent_signature)
+            if columns is not None:
+                result = stage.load(columns)
+                self.loads[name] += 1
+        if result is None:
+            inputs = [self.get(dependency) for dependency in stage.dependencies]
+            result = stage.compute(*inputs, **stage_params)
+            self.computations[name] += 1
+            if persistent_signature is not None:
+                self.store.store_result(persistent_signature, stage.dump(result))
+        self._store(name, key, result, signature)
+        return result
+
+    def set(self, name, result, **params):
+        """Set the result of a stage.
+
+        A source value replaces any previous value, invalidating all results
+        downstream of it. The result of any other stage is memoized as if it
+        had been computed from the current inputs with the given parameters.
+        """
+        stage = self.stages[name]
+        memo = self.memos[name]
+        if stage.is_source:
+            memo.results = {'': (result, None)}
+            memo.version = next(_versions)
+            memo.state = stage.state(result) if stage.state is not None else None
+            return
+        key = params_key({**memo.params, **params})
+        self._store(name, key, result, self.signature(name, **params))
+
+    def _store(self, name, key, result, signature):
+        memo = self.memos[name]
+        # Results for other parameters are only kept while their inputs are unchanged
+        memo.results = {
+            other_key: (other_result, other_signature)
+            for (other_key, (other_result, other_signature)) in memo.results.items()
+            if other_signature[2] == signature[2]
+        }
+        memo.results[key] = (result, signature)
+
+    def clear(self, name):
+        """Forget all memoized results of a stage."""
+        self.memos[name].results = {}
@@ -1,14 +1,67 @@
 """Support for timeseries using pandas Series indexed with TimedeltaIndexes."""
+import numpy as np
+
 import pandas as pd
 
 from ventplotting.utilities import series
 
 
+def make_time_index(times, name='Time'):
+    """Make a TimedeltaIndex from times in seconds.
+
+    This is equivalent to pd.to_timedelta(times, unit='s') up to nanosecond
+    rounding, but vectorized over the whole array.
+    """
+    nanoseconds = np.round(np.asarray(times, dtype='float64') * 1e9)
+    return pd.TimedeltaIndex(nanoseconds.astype('timedelta64[ns]'), name=name)
+
+
+def interval_bounds(times, start_time=None, end_time=None):
+    """Get the index bounds of samples between start and end times, inclusive.
+
+    The times must be sorted. Start and end times may be scalars or arrays of
+    multiple intervals, in which case arrays of bounds are returned. The
+    samples of each interval are times[start:end].
+    """
+    times = np.asarray(times)
+    if start_time is None:
+        start = 0
+    else:
+        start = np.searchsorted(times, start_time, side='left')
+    if end_time is None:
+        end = len(times)
+    else:
+        end = np.searchsorted(times, end_time, side='right')
+    return (start, end)
+
+
+def time_index_bounds(
+        time_index, start_time=None, end_time=None,
+        start_time_units='s', end_time_units='s'
+):
+    """Get the index bounds of samples in a sorted TimedeltaIndex between two times."""
+    if start_time is not None:
+        start_time = pd.Timedelta(start_time, start_time_units).value
+    if end_time is not None:
+        end_time = pd.Timedelta(end_time, end_time_units).value
+    return interval_bounds(time_index.asi8, start_time=start_time, end_time=end_time)
+
+
 def slice_interval(
         timeseries, start_time=None, end_time=None,
         start_time_units='s', end_time_units='s'
 ):
     """Slice into a timeseries using start and end times."""
+    if (
+        isinstance(timeseries.index, pd.TimedeltaIndex)
+        and timeseries.index.is_monotonic_increasing
+    ):
+        (start, end) = time_index_bounds(
+            timeseries.index, start_time=start_time, end_time=end_time,
+            start_time_units=start_time_units, end_time_units=end_time_units
+        )
+        return timeseries.iloc[start:end]
+
     if start_time is not None:
         start_time = pd.Timedelta(start_time, start_time_units)
     if end_time is not None: